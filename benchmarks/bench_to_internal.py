@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Per-row cost of `TransferData._to_internal` on a synthetic dataset.
+
+Compares the compiled manifest plan with the previous implementation, which read
+the mapping, nullable fields and parsers from the manifest for every field of every item.
+
+Usage: python benchmarks/bench_to_internal.py [rows]
+"""
+from __future__ import print_function
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loadjson.tests.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from loadjson.loaders import TransferData  # noqa: E402
+
+MANIFEST = {
+    "model": "tests.MyModel",
+    "mapping": {"char_field": "object.name",
+                "text_field": "object.description.content",
+                "bool_field": "object.flags.is_truthy",
+                "int_field": "object.number",
+                "datetime_field": "object.created"},
+    "parsers": {"char_field": {"type": "string"},
+                "bool_field": {"type": "boolean", "invert": True},
+                "int_field": {"type": "integer"}},
+    "nullable": ["text_field"]
+}
+
+
+def generate(rows):
+    return [{"object": {"name": "Name {}".format(n),
+                        "description": {"content": "Text {}".format(n)},
+                        "flags": {"is_truthy": n % 2 == 0},
+                        "number": str(n),
+                        "created": "2016-03-08T21:45:00Z"}}
+            for n in range(rows)]
+
+
+class LegacyTransferData(TransferData):
+    """
+    `_to_internal` as it was before the manifest plan was introduced.
+    """
+
+    def _to_internal_type(self, field, value):
+        field_parser = self.manifest.get('parsers', {}).get(field)
+        if field_parser is None:
+            return value
+        field_type = field_parser.get('type')
+        if field_type == 'string':
+            return str(value)
+        elif field_type == 'integer':
+            return int(value)
+        elif field_type == 'boolean':
+            invert = field_parser.get('invert', False)
+            return not bool(value) if invert else bool(value)
+        return super(LegacyTransferData, self)._to_internal_type(field, value)
+
+    def _to_internal(self, item):
+        internal = self.get_manifest_value('mapping')
+        final_internal = {}
+        for field in internal.keys():
+            raw_value = item
+            for p in internal[field].split('.'):
+                raw_value = raw_value.get(p, {})
+            if not self._field_is_nullable(field):
+                assert raw_value is not None, "Invalid mapping '{}'".format(internal[field])
+            final_internal[field] = self._to_internal_type(field, raw_value)
+        return final_internal
+
+
+def run(loader_class, data):
+    td = loader_class(data=data, manifest=MANIFEST)
+    return min(timeit.repeat(lambda: [td._to_internal(item) for item in data], number=1, repeat=3))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = generate(rows)
+    before = run(LegacyTransferData, data)
+    after = run(TransferData, data)
+    print("rows: {}".format(rows))
+    print("before: {:.3f}s ({:.2f}us/row)".format(before, before / rows * 1e6))
+    print("after:  {:.3f}s ({:.2f}us/row)".format(after, after / rows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
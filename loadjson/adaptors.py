@@ -1,3 +1,10 @@
+import operator
+from functools import reduce
+from django.db import connections, router, transaction
+from django.db.models import Q
+from .compat import bulk_update, FieldDoesNotExist
+
+
 class BaseAdaptor(object):
     """
     `models` - a list of models in a format "<app_label>.<model_name>" that the adaptor is applied to.
@@ -33,6 +40,22 @@ class BaseAdaptor(object):
         """
         pass
 
+    def adapt_batch(self, datas):
+        """
+        Batch version of `adapt`, called once for every batch of items by `bulk` engine. Override it if the data
+        can be prepared faster for many items at once, ex. with one query instead of a query per item.
+
+        Usage: what returned gets saved, a list of the same length and order as `datas`
+        """
+        return [self.adapt(data) for data in datas]
+
+    def adapt_post_save_batch(self, objs, datas, m2m_datas):
+        """
+        Batch version of `adapt_post_save`, called once for every batch of saved objects by `bulk` engine.
+        """
+        for obj, data, m2m_data in zip(objs, datas, m2m_datas):
+            self.adapt_post_save(obj, data, m2m_data)
+
 
 class ModelHandler(object):
 
@@ -83,3 +106,154 @@ class ModelHandler(object):
 
         """
         return model.objects.update_or_create(defaults=data, **lookup_kwargs)
+
+    def update(self, model, obj, data, update_fields):
+        """
+
+        Args:
+            model: requested model
+            obj: instance - existing model instance
+            data: dict - processed data
+            update_fields: list - names of the changed fields to save
+
+        Returns: :instance - saved model instance
+
+        """
+        for field in update_fields:
+            setattr(obj, field, data[field])
+        obj.save(update_fields=update_fields)
+        return obj
+
+    def bulk_get(self, model, lookups):
+        """
+
+        Args:
+            model: requested model
+            lookups: list of dicts with the same fields to use during lookup
+
+        Returns: :list of instances that match any of the lookups, fetched with one query
+
+        """
+        if not lookups:
+            return []
+        lookup_fields = sorted(lookups[0].keys())
+        if len(lookup_fields) == 1 and all(lookup[lookup_fields[0]] is not None for lookup in lookups):
+            field = lookup_fields[0]
+            return list(model.objects.filter(**{field + '__in': set(lookup[field] for lookup in lookups)}))
+        return list(model.objects.filter(reduce(operator.or_, (Q(**lookup) for lookup in lookups))))
+
+    def can_bulk_upsert(self, model, lookup_fields):
+        """
+        Whether `bulk_upsert` saves rows of `model` with one native `INSERT ... ON CONFLICT` statement per batch:
+        the database is PostgreSQL or SQLite 3.24+ and `lookup_fields` are unique together.
+
+        Args:
+            model: requested model
+            lookup_fields: list of fields to use during lookup
+
+        Returns: :bool
+
+        """
+        connection = connections[router.db_for_write(model)]
+        if connection.vendor == 'sqlite':
+            if getattr(connection.Database, 'sqlite_version_info', (0,)) < (3, 24, 0):
+                return False
+        elif connection.vendor != 'postgresql':
+            return False
+        opts = model._meta
+        if opts.parents:
+            # multi-table inheritance, the rows are saved to several tables
+            return False
+        try:
+            fields = [opts.pk if name == 'pk' else opts.get_field(name) for name in lookup_fields]
+        except FieldDoesNotExist:
+            return False
+        if len(fields) == 1 and fields[0].unique:
+            return True
+        names = set(field.name for field in fields)
+        unique_together = [set(unique) for unique in opts.unique_together]
+        for constraint in getattr(opts, 'constraints', []):
+            # unique constraints of Django 2.2+, partial constraints can't be conflict targets
+            if getattr(constraint, 'fields', None) and getattr(constraint, 'condition', None) is None:
+                unique_together.append(set(constraint.fields))
+        return names in unique_together
+
+    def bulk_upsert(self, model, rows, lookup_fields, update_fields, batch_size=None):
+        """
+        Create the rows that do not exist and update `update_fields` of the existing rows, looked up by
+        `lookup_fields`. Uses native `INSERT ... ON CONFLICT` if possible (see `can_bulk_upsert`), otherwise
+        fetches the existing rows with `bulk_get` and saves the rows with `bulk_create` and `bulk_update`.
+        Note: primary keys of the created rows are not set, `save()` is not called and signals are not sent.
+
+        Args:
+            model: requested model
+            rows: list of dicts - processed data, must include the lookup and update fields
+            lookup_fields: list of fields to use during lookup
+            update_fields: list - names of the fields to save for the existing rows
+            batch_size: int - number of rows saved by one query
+
+        """
+        if not rows:
+            return
+        objs = {}
+        for row in rows:
+            obj = model(**row)
+            # the last row wins, the same row can't be written twice by one statement
+            objs[self._lookup_values(model, lookup_fields, obj)] = obj
+        if self.can_bulk_upsert(model, lookup_fields):
+            self._native_upsert(model, list(objs.values()), lookup_fields, update_fields, batch_size)
+            return
+
+        lookups = [dict(zip(lookup_fields, values)) for values in objs.keys()]
+        existing = dict((self._lookup_values(model, lookup_fields, obj), obj)
+                        for obj in self.bulk_get(model, lookups))
+        update_attnames = [model._meta.get_field(field).attname for field in update_fields]
+        to_create = []
+        to_update = []
+        for values, obj in iter(objs.items()):
+            existing_obj = existing.get(values)
+            if existing_obj is None:
+                to_create.append(obj)
+                continue
+            for attname in update_attnames:
+                setattr(existing_obj, attname, getattr(obj, attname))
+            to_update.append(existing_obj)
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+        bulk_update(model, to_update, update_fields, batch_size=batch_size)
+
+    def _lookup_values(self, model, lookup_fields, obj):
+        values = []
+        for name in lookup_fields:
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            values.append(field.to_python(getattr(obj, field.attname)))
+        return tuple(values)
+
+    def _native_upsert(self, model, objs, lookup_fields, update_fields, batch_size=None):
+        db = router.db_for_write(model)
+        connection = connections[db]
+        opts = model._meta
+        quote_name = connection.ops.quote_name
+        conflict = [opts.pk if name == 'pk' else opts.get_field(name) for name in lookup_fields]
+        fields = [field for field in opts.concrete_fields if field != opts.auto_field or field in conflict]
+        update = [field for field in fields
+                  if field not in conflict and (field.name in update_fields or field.attname in update_fields)]
+        if update:
+            action = 'DO UPDATE SET {}'.format(
+                ', '.join('{0} = EXCLUDED.{0}'.format(quote_name(field.column)) for field in update))
+        else:
+            action = 'DO NOTHING'
+        max_batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+        batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+        with transaction.atomic(using=db, savepoint=False), connection.cursor() as cursor:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                params = []
+                for obj in batch:
+                    params.extend(field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+                sql = 'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({conflict}) {action}'
+                cursor.execute(sql.format(
+                    table=quote_name(opts.db_table),
+                    columns=', '.join(quote_name(field.column) for field in fields),
+                    values=', '.join(['({})'.format(', '.join(['%s'] * len(fields)))] * len(batch)),
+                    conflict=', '.join(quote_name(field.column) for field in conflict),
+                    action=action), params)
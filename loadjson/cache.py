@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Bounded mapping that evicts the least recently used key once `maxsize` is reached.
+    `maxsize` of None means unbounded.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        # move to the end, as the most recently used
+        self._data[key] = value
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class FIFOCache(LRUCache):
+    """
+    Bounded mapping that evicts the oldest key once `maxsize` is reached, regardless of how often it is used.
+    """
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+
+CACHE_POLICIES = {
+    'lru': LRUCache,
+    'fifo': FIFOCache,
+}
+
+
+def make_cache(policy='lru', maxsize=128):
+    """
+    Args:
+        policy: "lru" or "fifo" - eviction policy
+        maxsize: max number of keys, None for unbounded
+
+    Returns: :cache instance
+    """
+    if policy not in CACHE_POLICIES:
+        raise ValueError("'{}' cache policy is not supported".format(policy))
+    return CACHE_POLICIES[policy](maxsize)
@@ -1,6 +1,41 @@
-
 try:
     from django.apps import apps
     get_model = apps.get_model
 except ImportError:
     from django.db.models import get_model
+
+try:
+    from django.core.exceptions import FieldDoesNotExist
+except ImportError:
+    from django.db.models.fields import FieldDoesNotExist
+
+
+def bulk_update(model, objs, fields, batch_size=None):
+    """
+    `QuerySet.bulk_update` is only available since Django 2.2, older versions
+    fall back to saving every object with `update_fields`.
+    """
+    if not objs or not fields:
+        return
+    if hasattr(model.objects, 'bulk_update'):
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+    else:
+        for obj in objs:
+            obj.save(update_fields=fields)
+
+
+def can_return_bulk_pks(using='default'):
+    """
+    Whether `bulk_create` sets primary keys on the created objects.
+    """
+    from django.db import connections
+    features = connections[using].features
+    return bool(getattr(features, 'can_return_rows_from_bulk_insert',
+                        getattr(features, 'can_return_ids_from_bulk_insert', False)))
+
+
+def get_remote_field(field):
+    """
+    `Field.rel` was renamed to `Field.remote_field` in Django 1.9.
+    """
+    return getattr(field, 'remote_field', None) or field.rel
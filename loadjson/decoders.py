@@ -0,0 +1,89 @@
+import importlib
+
+
+class BaseDecoder(object):
+    """
+    Decodes JSON documents. `module` is imported on init, `ImportError` is raised if it is not installed.
+    """
+    module = None
+
+    def __init__(self):
+        self.json = importlib.import_module(self.module)
+
+    def loads(self, data):
+        """
+        Args:
+            data: str or bytes - JSON document
+
+        Returns: decoded python value
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return self.json.loads(data)
+
+
+class StdlibDecoder(BaseDecoder):
+    module = 'json'
+
+
+class OrjsonDecoder(BaseDecoder):
+    module = 'orjson'
+
+    def loads(self, data):
+        # orjson accepts bytes as is
+        return self.json.loads(data)
+
+
+class UjsonDecoder(BaseDecoder):
+    module = 'ujson'
+
+
+class RapidjsonDecoder(BaseDecoder):
+    module = 'rapidjson'
+
+
+# in order of preference for "auto"
+DECODER_CLASSES = (
+    ('orjson', OrjsonDecoder),
+    ('ujson', UjsonDecoder),
+    ('rapidjson', RapidjsonDecoder),
+    ('json', StdlibDecoder),
+)
+
+
+def get_decoder(name=None):
+    """
+    Args:
+        name: "auto" (or None) - the fastest installed decoder, "json", "orjson", "ujson", "rapidjson",
+            or a path to a custom decoder class, ex. "myapp.decoders.MyDecoder"
+
+    Returns: :decoder instance
+    """
+    if name is None or name == 'auto':
+        for _, decoder_class in DECODER_CLASSES:
+            try:
+                return decoder_class()
+            except ImportError:
+                continue
+    decoder_classes = dict(DECODER_CLASSES)
+    if name in decoder_classes:
+        return decoder_classes[name]()
+    parts = name.split('.')
+    if len(parts) < 2 or not all(parts):
+        raise ValueError("'{}' decoder is not supported, use one of: auto, {} or a path to a decoder class".format(
+            name, ", ".join(decoder_name for decoder_name, _ in DECODER_CLASSES)))
+    module = importlib.import_module('.'.join(parts[:-1]))
+    return getattr(module, parts[-1])()
+
+
+def available_decoders():
+    """
+    Returns: :list of (name, decoder instance) of all installed decoders
+    """
+    decoders = []
+    for name, decoder_class in DECODER_CLASSES:
+        try:
+            decoders.append((name, decoder_class()))
+        except ImportError:
+            continue
+    return decoders
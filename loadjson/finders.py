@@ -1,6 +1,6 @@
 import os
-import json
-from io import open
+from .decoders import get_decoder
+from .streams import JSONArrayStream, JSONLinesStream, LoadedData, COMPRESSIONS, get_compression
 
 
 class LoaderNotConfigured(Exception):
@@ -8,27 +8,69 @@ class LoaderNotConfigured(Exception):
 
 
 class DefaultDataFinder(object):
+    """
+    Finds `<data_name>.json` (a list of items) or `<data_name>.jsonl`/`<data_name>.ndjson` (one item per line)
+    and `<data_name>.manifest.json` in `data_dirs`. Data files may be compressed: `<data_name>.json.gz`,
+    `.json.bz2`, `.json.xz` (and the same for `.jsonl`/`.ndjson`).
 
-    def __init__(self, data_dirs):
+    `stream` - if True, data is not loaded into memory, but returned as a stream that reads items one by one.
+    `decoder` - JSON decoder to use, see `loadjson.decoders.get_decoder`. Defaults to the fastest installed.
+    """
+    data_extensions = ('.json', '.jsonl', '.ndjson')
+    lines_extensions = ('.jsonl', '.ndjson')
+
+    def __init__(self, data_dirs, stream=False, decoder=None):
         self.data_dirs = data_dirs
+        self.stream = stream
+        self.decoder = decoder if decoder is not None else get_decoder()
+
+    def _split_extension(self, data_name):
+        compression = get_compression(data_name)
+        if compression is not None:
+            data_name = data_name[:-len(compression)]
+        for ext in self.data_extensions:
+            if data_name.endswith(ext):
+                return data_name[:-len(ext)], ext
+        return data_name, None
 
     def find(self, data_name):
-        file_name = data_name
-        if '.json' not in file_name:
-            file_name += '.json'
-        return self.find_locations(file_name)
+        d_file, d_ext = self._split_extension(data_name)
+        if d_ext is not None:
+            file_names = [data_name]
+        else:
+            file_names = [data_name + ext for ext in self.data_extensions]
+            file_names += [file_name + compression for file_name in file_names for compression in COMPRESSIONS]
+        for file_name in file_names:
+            data = self.find_locations(file_name, stream=self.stream)
+            if data is not None:
+                return data
 
     def find_manifest(self, data_name):
-        if '.json' in data_name:
-            d_file, d_ext = os.path.splitext(data_name)
-            manifest_path = "{path}.manifest{ext}".format(path=d_file, ext=d_ext)
-        else:
-            manifest_path = data_name + '.manifest.json'
-        return self.find_locations(manifest_path)
+        d_file, d_ext = self._split_extension(data_name)
+        return self.find_locations(d_file + '.manifest.json')
 
-    def find_locations(self, file_name):
+    def find_locations(self, file_name, stream=False):
         for d_dir in self.data_dirs:
             file_path = os.path.join(d_dir, file_name)
             if os.path.isfile(file_path):
-                with open(file_path, encoding='utf-8') as data:
-                    return json.load(data)
+                compression = get_compression(file_name)
+                if compression is not None:
+                    file_name = file_name[:-len(compression)]
+                if file_name.endswith(self.lines_extensions):
+                    data = JSONLinesStream(file_path, decoder=self.decoder)
+                    if stream:
+                        return data
+                    items = LoadedData(data, path=file_path)
+                else:
+                    data = JSONArrayStream(file_path)
+                    if stream:
+                        return data
+                    with data.open_binary() as binary:
+                        items = self.decoder.loads(binary.read())
+                    if not isinstance(items, list):
+                        # ex. a manifest
+                        return items
+                    items = LoadedData(items, path=file_path)
+                items.bytes_read = data.bytes_read
+                items.bytes_decompressed = data.bytes_decompressed
+                return items
@@ -0,0 +1,134 @@
+import os
+from .streams import get_compression
+
+
+class DependencyCycle(Exception):
+    pass
+
+
+def get_dependencies(manifest, context):
+    """
+    Data names of the datasets `manifest` depends on: the datasets relative keys are looked up in,
+    including the relative keys of relative object manifests.
+
+    Returns: :set of data names
+    """
+    dependencies = set()
+    manifests = [manifest]
+    seen = set()
+    while manifests:
+        manifest = manifests.pop()
+        if manifest is None or id(manifest) in seen:
+            continue
+        seen.add(id(manifest))
+        for options in iter((manifest.get('parsers') or {}).values()):
+            parser_type = options.get('type')
+            if parser_type == 'relative_key' and options.get('data_name'):
+                dependencies.add(options['data_name'])
+            elif parser_type == 'relative_object':
+                if options.get('manifest') is not None:
+                    manifests.append(options['manifest'])
+                elif options.get('data_name'):
+                    manifests.append(context.dependencies.get_manifest(options['data_name']))
+    return dependencies
+
+
+def build_graph(data_names, context):
+    """
+    Dependency graph of `data_names` datasets. Dependencies on other datasets (ex. imported earlier)
+    and on the dataset itself are not scheduled, so they are left out.
+
+    Returns: :dict - data name -> set of data names it depends on
+    """
+    graph = {}
+    for data_name in data_names:
+        manifest = context.dependencies.get_manifest(data_name)
+        dependencies = get_dependencies(manifest, context) if manifest is not None else set()
+        graph[data_name] = set(name for name in dependencies if name in data_names and name != data_name)
+    return graph
+
+
+def find_cycle(graph):
+    """
+    Returns: :list of data names that form a cycle, ex. ["a", "b", "a"], or None
+    """
+    visited = set()
+    for start in sorted(graph):
+        if start in visited:
+            continue
+        visited.add(start)
+        path = [start]
+        on_path = set(path)
+        stack = [(start, iter(sorted(graph[start])))]
+        while stack:
+            node, dependencies = stack[-1]
+            for dependency in dependencies:
+                if dependency in on_path:
+                    return path[path.index(dependency):] + [dependency]
+                if dependency not in visited:
+                    visited.add(dependency)
+                    path.append(dependency)
+                    on_path.add(dependency)
+                    stack.append((dependency, iter(sorted(graph[dependency]))))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+    return None
+
+
+def topological_levels(graph):
+    """
+    Order datasets so that every dataset goes after the datasets it depends on.
+    Datasets of one level do not depend on each other and can be imported concurrently.
+
+    Returns: :list of levels, lists of data names
+    """
+    cycle = find_cycle(graph)
+    if cycle is not None:
+        raise DependencyCycle("Datasets depend on each other: {}".format(" -> ".join(cycle)))
+    levels = []
+    done = set()
+    while len(done) < len(graph):
+        level = sorted(name for name, dependencies in iter(graph.items())
+                       if name not in done and dependencies <= done)
+        levels.append(level)
+        done.update(level)
+    return levels
+
+
+def get_released(order, context):
+    """
+    Datasets that are not needed any more after each dataset of `order` is imported: the dataset itself and
+    its dependencies, unless a dataset imported later depends on them.
+
+    Returns: :list of sets of data names, one per dataset of `order`
+    """
+    dependencies = []
+    for data_name in order:
+        manifest = context.dependencies.get_manifest(data_name)
+        dependencies.append(get_dependencies(manifest, context) if manifest is not None else set())
+    released = []
+    used = set()
+    for index, data_name in enumerate(order):
+        used.add(data_name)
+        used.update(dependencies[index])
+        needed = set().union(*dependencies[index + 1:])
+        released.append(used - needed)
+        used &= needed
+    return released
+
+
+def find_data_names(directory, finder):
+    """
+    Data names of all data files in `directory`, ex. "users" for "users.json" or "users.jsonl.gz".
+    """
+    data_names = set()
+    for file_name in os.listdir(directory):
+        if not os.path.isfile(os.path.join(directory, file_name)):
+            continue
+        data_name, ext = finder._split_extension(file_name)
+        if ext is None or (ext == '.json' and data_name.endswith('.manifest') and get_compression(file_name) is None):
+            continue
+        data_names.add(data_name)
+    return sorted(data_names)
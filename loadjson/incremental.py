@@ -0,0 +1,236 @@
+import os
+import json
+import sqlite3
+import hashlib
+import six
+from .loaders import InvalidManifest, chunks
+from .streams import DataStream
+
+
+# manifest options that do not change the imported values
+OPERATIONAL_OPTIONS = ('engine', 'batch_size', 'transaction_batch_size', 'skip_integrity_errors')
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def manifest_hash(manifest):
+    """
+    Returns: :sha1 hash object of the manifest, except `OPERATIONAL_OPTIONS`
+    """
+    manifest = dict((key, value) for key, value in iter(manifest.items()) if key not in OPERATIONAL_OPTIONS)
+    return hashlib.sha1(_dumps(manifest).encode('utf-8'))
+
+
+def lookup_paths(loader):
+    """
+    Returns: :list of the paths (tuples of keys) to the raw values of the manifest lookup fields
+    """
+    lookup_fields = loader.get_manifest_value('lookup')
+    if lookup_fields is None:
+        raise InvalidManifest("'lookup' is required")
+    if isinstance(lookup_fields, six.string_types):
+        lookup_fields = [lookup_fields]
+    mapping = loader.get_manifest_value('mapping') or {}
+    missing = [field for field in lookup_fields if field not in mapping]
+    if missing:
+        raise InvalidManifest("'lookup' fields must be mapped: {}".format(", ".join(missing)))
+    return [tuple(mapping[field].split('.')) for field in lookup_fields]
+
+
+def lookup_key(loader, item, paths):
+    """
+    Returns: :str - the raw lookup values of `item` (see `lookup_paths`) as JSON
+    """
+    return _dumps([loader._get_value(item, path) for path in paths])
+
+
+class ContentHashes(object):
+    """
+    Content hashes of the items of a dataset imported by the last successful run, stored in a SQLite database,
+    used to import only new and changed items.
+
+    Items are keyed by the raw values of the manifest lookup fields. The hash covers the item and the manifest,
+    so changing the manifest (except `OPERATIONAL_OPTIONS`) imports all the items again. Note, changes of
+    the datasets the items depend on (ex. by relative keys) are not detected.
+
+    Usage:
+        hashes = ContentHashes(state_file, loader)
+        loader.import_data(item_filter=hashes.filter)
+        hashes.commit()  # or hashes.rollback() if the import failed
+
+    `resume` - keep the hashes of the previous run that did not finish, see `Checkpoint`
+    `skipped` - number of unchanged items
+    """
+    batch_size = 500
+
+    def __init__(self, path, loader, data_name=None, resume=False):
+        self.loader = loader
+        self.data_name = data_name or ''
+        self.key_paths = lookup_paths(loader)
+        self.manifest_hash = manifest_hash(loader.manifest).hexdigest()
+        self.skipped = 0
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            for table in ('hashes', 'pending'):
+                self.connection.execute('CREATE TABLE IF NOT EXISTS {} (data_name TEXT, key TEXT, hash TEXT, '
+                                        'PRIMARY KEY (data_name, key))'.format(table))
+            if not resume:
+                # hashes of a run that did not finish
+                self.connection.execute('DELETE FROM pending WHERE data_name = ?', (self.data_name,))
+
+    def item_key(self, item):
+        return lookup_key(self.loader, item, self.key_paths)
+
+    def item_hash(self, item):
+        return hashlib.sha1((self.manifest_hash + _dumps(item)).encode('utf-8')).hexdigest()
+
+    def get_hashes(self, keys):
+        """
+        Returns: :dict - key -> hash of the last successful run
+        """
+        placeholders = ','.join('?' * len(keys))
+        rows = self.connection.execute(
+            'SELECT key, hash FROM hashes WHERE data_name = ? AND key IN ({})'.format(placeholders),
+            [self.data_name] + list(keys))
+        return dict(rows)
+
+    def filter(self, items):
+        """
+        Yield new and changed items, the hashes of yielded items are saved by `commit`.
+        """
+        for batch in chunks(items, self.batch_size):
+            rows = [(self.item_key(item), self.item_hash(item), item) for item in batch]
+            known = self.get_hashes(set(key for key, _, _ in rows))
+            changed = []
+            for key, digest, item in rows:
+                if known.get(key) == digest:
+                    self.skipped += 1
+                else:
+                    changed.append((key, digest, item))
+            with self.connection:
+                self.connection.executemany('INSERT OR REPLACE INTO pending VALUES (?, ?, ?)',
+                                            [(self.data_name, key, digest) for key, digest, _ in changed])
+            for _, _, item in changed:
+                yield item
+
+    def commit(self):
+        """
+        Save the hashes of the items imported by this run.
+        """
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO hashes SELECT data_name, key, hash FROM pending '
+                                    'WHERE data_name = ?', (self.data_name,))
+            self.connection.execute('DELETE FROM pending WHERE data_name = ?', (self.data_name,))
+
+    def rollback(self):
+        """
+        Forget the hashes of this run, so its items are imported again by the next run.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM pending WHERE data_name = ?', (self.data_name,))
+
+    def close(self):
+        self.connection.close()
+
+
+class Checkpoint(object):
+    """
+    Progress of an import, saved in a SQLite database every time imported items are committed,
+    used to resume an interrupted import without importing the committed items again.
+
+    The progress is the number of items imported (or the position in the file for streams that can be read
+    from the middle, see `DataStream.from_position`) and the report counters. It is used only if neither
+    the data nor the manifest changed since.
+
+    Usage:
+        checkpoint = Checkpoint(state_file, data_name, resume=True)
+        loader.import_data(checkpoint=checkpoint)
+        checkpoint.clear()
+
+    `resume` - resume from the saved progress, otherwise the import starts over
+    `resumed_from` - number of items skipped by the resumed import
+    """
+    counters = ('item', 'created', 'updated', 'unchanged')
+
+    def __init__(self, path, data_name=None, resume=True):
+        self.data_name = data_name or ''
+        self.resume_saved = resume
+        self.resumed_from = 0
+        self.stream = None
+        self.base = 0
+        self.filtered = False
+        self.fingerprint_value = None
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS checkpoints (data_name TEXT PRIMARY KEY, '
+                                    'fingerprint TEXT, position INTEGER, {})'.format(
+                                        ', '.join('{} INTEGER'.format(counter) for counter in self.counters)))
+
+    def fingerprint(self, loader):
+        """
+        Returns: :str - hash of the manifest and the data: path, modification time and size of the data file
+            (streamed or loaded by the finder, see `LoadedData`), or the items of the data given as a list
+        """
+        digest = manifest_hash(loader.manifest)
+        path = getattr(loader.data, 'path', None)
+        if path is not None:
+            stat = os.stat(path)
+            digest.update(_dumps([os.path.abspath(path), stat.st_mtime, stat.st_size]).encode('utf-8'))
+        else:
+            for item in loader.data:
+                digest.update(_dumps(item).encode('utf-8'))
+        return digest.hexdigest()
+
+    def resume(self, loader, filtered=False):
+        """
+        Restore the saved progress of `loader` import.
+
+        Args:
+            loader: TransferData to import
+            filtered: bool - whether the data is filtered before importing, positions in the file can't be used then
+
+        Returns: :tuple (data to import, number of items to skip)
+        """
+        self.fingerprint_value = self.fingerprint(loader)
+        self.filtered = filtered
+        self.stream = loader.data if isinstance(loader.data, DataStream) else None
+        self.base = 0
+        row = self.connection.execute('SELECT fingerprint, position, {} FROM checkpoints WHERE data_name = ?'.format(
+            ', '.join(self.counters)), (self.data_name,)).fetchone()
+        if not self.resume_saved or row is None or row[0] != self.fingerprint_value:
+            return loader.data, 0
+        position, counters = row[1], dict(zip(self.counters, row[2:]))
+        for counter, value in iter(counters.items()):
+            setattr(loader.report, counter, value)
+        self.resumed_from = counters['item']
+        if position is not None and self.stream is not None and not filtered:
+            stream = self.stream.from_position(position)
+            if stream is not None:
+                self.stream, self.base = stream, position
+                return stream, 0
+        return loader.data, counters['item']
+
+    def save(self, loader):
+        """
+        Save the progress of `loader`.
+        """
+        position = None
+        if self.stream is not None and not self.filtered:
+            position = self.base + self.stream.position
+        values = [self.data_name, self.fingerprint_value, position]
+        values.extend(getattr(loader.report, counter) for counter in self.counters)
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO checkpoints VALUES ({})'.format(
+                ', '.join('?' * len(values))), values)
+
+    def clear(self):
+        """
+        Forget the progress, ex. once the import is finished.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM checkpoints WHERE data_name = ?', (self.data_name,))
+
+    def close(self):
+        self.connection.close()
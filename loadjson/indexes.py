@@ -0,0 +1,120 @@
+import os
+import json
+import sqlite3
+import hashlib
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+class RKIndex(object):
+    """
+    On-disk index of a streamed data file by relative key, stored in a SQLite database.
+
+    The index is built on first use and reused by later import runs for as long as the data file is not
+    modified (same mtime and size), so large dependency datasets are neither read nor kept in memory.
+    One database per data file holds the indices of every relative key (and projection, see `ProjectedStream`).
+
+    `stream` - DataStream of the data file
+    `rk` - relative key path, ex. "key" or "nested.key"
+    `index_dir` - directory of the database, defaults to the data file directory: `<data file>.rkindex`
+
+    The index is checked and built in one write transaction, so processes that open the same index at once
+    wait (up to `timeout` seconds) for the one that builds it, and reuse it. Close the index when it is not
+    used any more, or use it as a context manager.
+    """
+    batch_size = 1000
+    extension = '.rkindex'
+    timeout = 600
+
+    def __init__(self, stream, rk, index_dir=None):
+        self.stream = stream
+        self.rk = rk
+        self.db_path = self.get_db_path(stream.path, index_dir)
+        paths = getattr(stream, 'paths', None)
+        self.projection = _dumps(sorted(paths)) if paths is not None else ''
+        self.built = False
+        self.connection = None
+        self.index_id = None
+
+    def get_db_path(self, path, index_dir=None):
+        if index_dir is None:
+            return path + self.extension
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(index_dir, '{}.{}{}'.format(os.path.basename(path), digest, self.extension))
+
+    def fingerprint(self):
+        stat = os.stat(self.stream.path)
+        return stat.st_mtime, stat.st_size
+
+    def open(self):
+        if self.connection is not None:
+            return
+        # transactions are started explicitly
+        self.connection = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        try:
+            with self.connection:
+                # lock the database before the index is checked, so it is built by one process only
+                self.connection.execute('BEGIN IMMEDIATE')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS indices (id INTEGER PRIMARY KEY, rk TEXT, '
+                                        'projection TEXT, mtime REAL, size INTEGER, UNIQUE (rk, projection))')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS entries (index_id INTEGER, value TEXT, item TEXT)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS entries_value ON entries (index_id, value)')
+                mtime, size = self.fingerprint()
+                row = self.connection.execute('SELECT id, mtime, size FROM indices WHERE rk = ? AND projection = ?',
+                                              (self.rk, self.projection)).fetchone()
+                if row is not None and row[1] == mtime and row[2] == size:
+                    self.index_id = row[0]
+                else:
+                    self.build(mtime, size)
+        except Exception:
+            self.close()
+            raise
+
+    def build(self, mtime, size):
+        """
+        Index the data file, called within the transaction of `open`.
+        """
+        rk_path = self.rk.split('.')
+        self.connection.execute('DELETE FROM entries WHERE index_id IN '
+                                '(SELECT id FROM indices WHERE rk = ? AND projection = ?)',
+                                (self.rk, self.projection))
+        self.connection.execute('DELETE FROM indices WHERE rk = ? AND projection = ?', (self.rk, self.projection))
+        self.index_id = self.connection.execute(
+            'INSERT INTO indices (rk, projection, mtime, size) VALUES (?, ?, ?, ?)',
+            (self.rk, self.projection, mtime, size)).lastrowid
+        rows = []
+        for item in self.stream:
+            rk_val = item
+            for p in rk_path:
+                rk_val = rk_val[p]
+            rows.append((self.index_id, _dumps(rk_val), _dumps(item)))
+            if len(rows) >= self.batch_size:
+                self.connection.executemany('INSERT INTO entries VALUES (?, ?, ?)', rows)
+                rows = []
+        if rows:
+            self.connection.executemany('INSERT INTO entries VALUES (?, ?, ?)', rows)
+        self.built = True
+
+    def get(self, value, default=None):
+        """
+        Returns: :list of items with `value` relative key, or `default` if there are none
+        """
+        self.open()
+        rows = self.connection.execute('SELECT item FROM entries WHERE index_id = ? AND value = ? ORDER BY rowid',
+                                       (self.index_id, _dumps(value))).fetchall()
+        if not rows:
+            return default
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
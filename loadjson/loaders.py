@@ -1,12 +1,19 @@
 import sys
+import itertools
 import importlib
-import dateutil.parser
 import six
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
 from django.db.utils import IntegrityError
-from .compat import get_model
+from .cache import make_cache
+from .compat import get_model, bulk_update, can_return_bulk_pks, get_remote_field, FieldDoesNotExist
+from .adaptors import ModelHandler
+from .decoders import get_decoder
 from .finders import DefaultDataFinder
+from .indexes import RKIndex
+from .streams import DataStream, LoadedData, ProjectedStream, project
 
 
 class LoadNotConfigured(Exception):
@@ -32,11 +39,15 @@ def get_settings():
     return loadjson_settings
 
 
-def find_data(data_name):
+def get_finders(stream=None, decoder=None):
     loadjson_settings = get_settings()
     data_dirs = loadjson_settings.get('DATA_DIRS', [])
     finder_classes = loadjson_settings.get('FINDER_CLASSES')
-    finders = [DefaultDataFinder(data_dirs)]
+    if stream is None:
+        stream = loadjson_settings.get('STREAM', False)
+    if decoder is None:
+        decoder = loadjson_settings.get('JSON_DECODER')
+    finders = [DefaultDataFinder(data_dirs, stream=stream, decoder=get_decoder(decoder))]
     if isinstance(finder_classes, list):
         for class_string in finder_classes:
             try:
@@ -44,15 +55,24 @@ def find_data(data_name):
                 finders.append(finder_class())
             except ImportError:
                 raise ImportError("Unable to import {}".format(class_string))
-    data = None
+    return finders
+
+
+def find_data(data_name, stream=None, decoder=None, finders=None, data=True, manifest=True):
+    """
+    Returns: :tuple (data, manifest) - the first data and manifest found by finders
+    """
+    if finders is None:
+        finders = get_finders(stream=stream, decoder=decoder)
+    data_found = None
     data_manifest = None
     for finder in finders:
-        if data is None:
-            data = finder.find(data_name)
-        if data_manifest is None:
+        if data and data_found is None:
+            data_found = finder.find(data_name)
+        if manifest and data_manifest is None:
             data_manifest = finder.find_manifest(data_name)
 
-    return data, data_manifest
+    return data_found, data_manifest
 
 
 def import_from_string(class_path):
@@ -74,6 +94,25 @@ def get_adaptor_classes():
     return adaptor_classes
 
 
+def get_parser_classes():
+    """
+    Built-in parser classes updated with `PARSER_CLASSES` setting.
+
+    Returns: :dict - parser type -> parser class
+    """
+    from .parsers import PARSER_CLASSES
+    loadjson_settings = get_settings()
+    parser_classes_settings = dict(PARSER_CLASSES)
+    parser_classes_settings.update(loadjson_settings.get('PARSER_CLASSES', {}))
+    parser_classes = {}
+    for parser_type, class_string in iter(parser_classes_settings.items()):
+        try:
+            parser_classes[parser_type] = import_from_string(class_string)
+        except ImportError:
+            raise ImportError("Unable to import {}".format(class_string))
+    return parser_classes
+
+
 def get_model_handler_class():
     loadjson_settings = get_settings()
     model_handler_setting = loadjson_settings.get('MODEL_HANDLER')
@@ -82,26 +121,218 @@ def get_model_handler_class():
     return import_from_string(model_handler_setting)()
 
 
+class DependencyRegistry(object):
+    """
+    Loaders of datasets referenced by relative keys, loaded once per import run by data name.
+    Loaders keep their relative key indices, so each dependency is read and indexed once.
+
+    Unless `PROJECT_DEPENDENCIES` setting is False, dependencies requested by relative key are loaded
+    with projection: only the relative key path and the paths of the lookup fields are kept in memory,
+    and only the lookup fields are converted.
+
+    `hits`, `misses` - number of requests served from the registry and number of datasets loaded
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.loaders = {}
+        self.manifests = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, data_name):
+        return data_name in self.loaders
+
+    def register(self, data_name, loader):
+        if data_name not in self.loaders:
+            self.loaders[data_name] = loader
+
+    def unregister(self, data_name):
+        self.loaders.pop(data_name, None)
+
+    def get_manifest(self, data_name):
+        if data_name not in self.manifests:
+            self.manifests[data_name] = self.context.find_data(data_name, data=False)[1]
+        return self.manifests[data_name]
+
+    def get_projection(self, data_name, rk, lookup=None):
+        """
+        Returns: :tuple (set of paths, set of fields) required to lookup objects by `rk`,
+            or (None, None) if the whole dataset is required
+        """
+        manifest = self.get_manifest(data_name)
+        if rk is None or manifest is None or not self.context.settings.get('PROJECT_DEPENDENCIES', True):
+            return None, None
+        lookup_fields = lookup if lookup is not None else manifest.get('lookup')
+        if lookup_fields is None:
+            return None, None
+        if isinstance(lookup_fields, six.string_types):
+            lookup_fields = [lookup_fields]
+        mapping = manifest.get('mapping', {})
+        paths = set([tuple(rk.split('.'))])
+        for field in lookup_fields:
+            if field in mapping:
+                paths.add(tuple(mapping[field].split('.')))
+        return paths, set(lookup_fields)
+
+    def get(self, data_name, rk=None, lookup=None):
+        paths, fields = self.get_projection(data_name, rk, lookup=lookup)
+        loader = self.loaders.get(data_name)
+        if loader is not None:
+            covered = loader.projection is None or (paths is not None and paths <= loader.projection)
+            if covered and (loader.fields is None or fields <= loader.fields):
+                self.hits += 1
+                return loader
+            # loaded with a narrower projection, load again with both
+            if paths is not None:
+                paths, fields = paths | loader.projection, fields | loader.fields
+        self.misses += 1
+        loader = TransferData(data_name=data_name, manifest=self.get_manifest(data_name), context=self.context,
+                              projection=paths, fields=fields)
+        self.loaders[data_name] = loader
+        return loader
+
+
+class LoaderContext(object):
+    """
+    Settings, finders, adaptor and parser classes, model handler, models and loaders resolved once per import run
+    and shared by all loaders of the run, including the nested ones.
+    """
+
+    def __init__(self, stream=None, decoder=None):
+        self.settings = get_settings()
+        self.finders = get_finders(stream=stream, decoder=decoder)
+        self.adaptor_classes = get_adaptor_classes()
+        self.parser_classes = get_parser_classes()
+        self.model_handler = get_model_handler_class()
+        self.models = {}
+        self.loaders = {}
+        self.dependencies = DependencyRegistry(self)
+
+    def make_rk_cache(self):
+        """
+        Cache for relative key lookups, bounded by `RK_CACHE_SIZE` setting (None for unbounded)
+        with `RK_CACHE_POLICY` ("lru" or "fifo") eviction policy.
+        """
+        return make_cache(self.settings.get('RK_CACHE_POLICY', 'lru'), self.settings.get('RK_CACHE_SIZE', 10000))
+
+    def make_rk_index(self, data, rk):
+        """
+        On-disk relative key index of streamed `data` if `RK_INDEX` setting is True, stored in `RK_INDEX_DIR`
+        (defaults to the data file directory). Returns None if the index is not used.
+        """
+        if not self.settings.get('RK_INDEX', False) or not isinstance(data, DataStream) or data.path is None:
+            return None
+        return RKIndex(data, rk, index_dir=self.settings.get('RK_INDEX_DIR'))
+
+    def invalidate_objects(self):
+        """
+        Forget the objects memoized by the loaders of the run, called when a transaction is rolled back,
+        so the objects it saved are not used as related objects any more.
+        """
+        for loader in list(self.dependencies.loaders.values()) + list(self.loaders.values()):
+            loader.invalidate_objects()
+
+    def find_data(self, data_name, data=True, manifest=True):
+        return find_data(data_name, finders=self.finders, data=data, manifest=manifest)
+
+    def get_model(self, label):
+        if label not in self.models:
+            app_label, app_model = label.split('.')
+            self.models[label] = get_model(app_label, app_model)
+        return self.models[label]
+
+    def release(self, data_names):
+        """
+        Drop the loaders of `data_names` datasets, so their data and relative key caches can be freed.
+        Loaders of relative objects are dropped too, their parsers keep the dependencies they looked up.
+        """
+        if not data_names:
+            return
+        for data_name in data_names:
+            loader = self.dependencies.loaders.get(data_name)
+            if loader is not None:
+                loader.close()
+            self.dependencies.unregister(data_name)
+        self.loaders.clear()
+
+    def close(self):
+        """
+        Close the on-disk relative key indices of the loaders of the run, called when the run ends.
+        """
+        for loader in list(self.dependencies.loaders.values()) + list(self.loaders.values()):
+            loader.close()
+
+    def get_loader(self, data_name=None, manifest=None):
+        """
+        Loader for relative objects, created once per data name/manifest and reused for every parent item.
+        """
+        key = (data_name, id(manifest))
+        loader = self.loaders.get(key)
+        if loader is None or (manifest is not None and loader.manifest is not manifest):
+            loader = TransferData(data=[], manifest=manifest, data_name=data_name, context=self)
+            self.loaders[key] = loader
+        return loader
+
+
+FieldPlan = namedtuple('FieldPlan', ['field', 'path', 'nullable', 'parser', 'options'])
+FieldPlan.__doc__ = """
+Compiled mapping of one model field:
+`path` - a tuple of keys to the raw value, `parser` - a callable that converts the raw value (or None),
+`options` - parser definition from the manifest.
+"""
+
+ManifestPlan = namedtuple('ManifestPlan', ['fields', 'parsers', 'm2m_fields'])
+ManifestPlan.__doc__ = """
+Compiled manifest: a tuple of `FieldPlan` (None if manifest does not define 'mapping'),
+a dict of field parsers and a frozenset of many-to-many fields.
+"""
+
+
+def chunks(iterable, size):
+    """
+    Split iterable into lists of `size` items. The last chunk may be shorter.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 class BaseLoader(object):
+    engines = ('default', 'bulk')
     manifest_defaults = {
         'lookup_allow_null': False,
         'rk_lookup': 'pk',
-        'update': True
+        'update': True,
+        'engine': 'default',
+        'batch_size': 500,
+        'transaction_batch_size': None,
+        'm2m_mode': 'replace',
+        'skip_unchanged': False,
+        'deferred_fields': []
     }
+    m2m_modes = ('replace', 'append')
 
     def __init__(self, *args, **kwargs):
         # Load settings
-        load_settings = get_settings()
-        defaults = load_settings.get('MANIFEST_DEFAULTS', {})
+        self.context = kwargs.get('context')
+        if self.context is None:
+            self.context = LoaderContext(stream=kwargs.get('stream'), decoder=kwargs.get('decoder'))
+        defaults = self.context.settings.get('MANIFEST_DEFAULTS', {})
         if defaults and isinstance(defaults, dict):
-            self.manifest_defaults.update(defaults)
+            self.manifest_defaults = dict(self.manifest_defaults, **defaults)
 
         # Load data
         data_name = kwargs.get('data_name')
         self.data = kwargs.get('data')
         self.manifest = kwargs.get('manifest')
         if self.data is None or self.manifest is None:
-            data, manifest = find_data(data_name)
+            data, manifest = self.context.find_data(data_name, data=self.data is None, manifest=self.manifest is None)
             if self.data is None:
                 self.data = data
             if self.manifest is None:
@@ -111,20 +342,54 @@ class BaseLoader(object):
         if self.manifest is None:
             raise LoadNotConfigured("Can't find manifest for {}".format(data_name or ''))
 
+        # Keep only the values at `projection` paths of every item, and convert only `fields`
+        self.projection = kwargs.get('projection')
+        self.fields = kwargs.get('fields')
+        if self.projection is not None:
+            if isinstance(self.data, DataStream):
+                self.data = ProjectedStream(self.data, self.projection)
+            else:
+                self.data = [project(item, self.projection) for item in self.data]
+
     def get_manifest_value(self, field, default=None):
         return self.manifest.get(field, default if default is not None else self.manifest_defaults.get(field))
 
+    def _lookup_fields(self):
+        lookup_fields = self.get_manifest_value('lookup')
+        if isinstance(lookup_fields, six.string_types):
+            lookup_fields = [lookup_fields]
+        return lookup_fields
+
     def _field_is_nullable(self, field):
         nullable = self.manifest.get('nullable', [])
         return field in nullable
 
     def _validate(self):
-        assert isinstance(self.data, list), "Data must be a list, got {} instead.".format(type(self.data))
+        assert isinstance(self.data, (list, DataStream)), "Data must be a list, got {} instead.".format(type(self.data))
+        engine = self.get_manifest_value('engine')
+        if engine not in self.engines:
+            raise InvalidManifest("'{}' engine is not supported".format(engine))
+        if self.get_manifest_value('m2m_mode') not in self.m2m_modes:
+            raise InvalidManifest("'m2m_mode' must be one of: {}".format(", ".join(self.m2m_modes)))
+        transaction_batch_size = self.get_manifest_value('transaction_batch_size')
+        if transaction_batch_size is not None:
+            if not isinstance(transaction_batch_size, six.integer_types) or transaction_batch_size < 1:
+                raise InvalidManifest("'transaction_batch_size' must be a positive integer")
+        deferred_fields = self.get_manifest_value('deferred_fields')
+        if deferred_fields:
+            lookup_fields = self._lookup_fields()
+            if lookup_fields is None:
+                raise InvalidManifest("'lookup' is required to import 'deferred_fields'")
+            mapping = self.get_manifest_value('mapping') or {}
+            invalid = [field for field in deferred_fields if field not in mapping or field in lookup_fields]
+            if invalid:
+                raise InvalidManifest("'deferred_fields' must be mapped and can't be 'lookup' fields: {}".format(
+                    ", ".join(invalid)))
 
     def valid(self, silent=True):
         try:
             self._validate()
-        except AssertionError as e:
+        except (AssertionError, InvalidManifest) as e:
             if not silent:
                 raise e
             return False
@@ -133,58 +398,111 @@ class BaseLoader(object):
 
 class TransferData(BaseLoader):
     adaptors = None
+    checkpoint = None
 
     def _apply_adaptors(self, data):
         if self.adaptors is None:
             return data
         for adaptor in self.adaptors:
-            if adaptor.models is None or self.app_model in adaptor.models:
-                data = adaptor.adapt(data)
+            data = adaptor.adapt(data)
         return data
 
+    def _apply_adaptors_batch(self, datas):
+        """
+        Apply the adaptors to a batch of data, adaptors without `adapt_batch` are applied item by item.
+        """
+        if self.adaptors is None:
+            return datas
+        for adaptor in self.adaptors:
+            adapt_batch = getattr(adaptor, 'adapt_batch', None)
+            if adapt_batch is not None:
+                datas = adapt_batch(datas)
+            else:
+                datas = [adaptor.adapt(data) for data in datas]
+        return datas
+
     def _post_save(self, obj, data, m2m_data):
         if self.adaptors is not None:
             for adaptor in self.adaptors:
                 adaptor.adapt_post_save(obj, data, m2m_data)
         return obj
 
+    def _post_save_batch(self, objs, datas, m2m_datas):
+        if self.adaptors is None:
+            return
+        for adaptor in self.adaptors:
+            adapt_post_save_batch = getattr(adaptor, 'adapt_post_save_batch', None)
+            if adapt_post_save_batch is not None:
+                adapt_post_save_batch(objs, datas, m2m_datas)
+            else:
+                for obj, data, m2m_data in zip(objs, datas, m2m_datas):
+                    adaptor.adapt_post_save(obj, data, m2m_data)
+
     def __init__(self, *args, **kwargs):
         super(TransferData, self).__init__(*args, **kwargs)
 
         # Initialize manifest
         self.app_model = self.get_manifest_value('model')
         self.model = self._get_model(self.get_manifest_value('model'))
-        self.model_handler = get_model_handler_class()
-        adaptor_classes = get_adaptor_classes()
+        self.model_handler = self.context.model_handler
+        adaptor_classes = self.context.adaptor_classes
         if isinstance(adaptor_classes, list):
-            self.adaptors = [adaptor(self.model, self.app_model, self.manifest) for adaptor in adaptor_classes]
+            # only the adaptors of the model
+            self.adaptors = [adaptor(self.model, self.app_model, self.manifest) for adaptor in adaptor_classes
+                             if adaptor.models is None or self.app_model in adaptor.models]
         if self.model is None:
             raise ValueError("manifest does not define 'model'")
-        self.__dependencies = {}
         self.__indices = {}
+        self.__rk_objects = {}
+        self.__rk_internals = {}
+        self.__m2m_through = {}
+        self.__lookup_plan = None
+        self.parser_classes = self.context.parser_classes
+        self.plan = self.compile_manifest()
 
         # Import status
+        if isinstance(self.data, DataStream):
+            count, count_estimated = self.data.estimate_count(), True
+        else:
+            count, count_estimated = len(self.data), False
         self.report = type('Report', (object,),
-                           dict(created=0, updated=0, exceptions=defaultdict(list),
-                                count=len(self.data), item=0))()
+                           dict(created=0, updated=0, unchanged=0, exceptions=defaultdict(list),
+                                count=count, count_estimated=count_estimated, item=0,
+                                bytes_read=None, bytes_decompressed=None))()
+
+        if kwargs.get('data') is None and kwargs.get('manifest') is None and kwargs.get('data_name') is not None:
+            # other datasets of the run may depend on this one
+            self.context.dependencies.register(kwargs['data_name'], self)
 
     def write_std_out(self):
-        message = "\r{item}/{count} (Created: {created}, Updated: {updated})".format(
-            count=self.report.count,
+        count = self.report.count
+        if count is None:
+            count = '?'
+        elif self.report.count_estimated:
+            count = '~{}'.format(count)
+        message = "\r{item}/{count} (Created: {created}, Updated: {updated}, Unchanged: {unchanged})".format(
+            count=count,
             item=self.report.item,
             created=self.report.created,
-            updated=self.report.updated
+            updated=self.report.updated,
+            unchanged=self.report.unchanged
         )
         sys.stdout.write(message)
         sys.stdout.flush()
 
-    def get_dependency(self, file_name):
-        if self.__dependencies.get(file_name) is not None:
-            return self.__dependencies[file_name]
-        td = TransferData(data_name=file_name)
-        # cache dependency for later use
-        self.__dependencies[file_name] = td
-        return td
+    def get_parser_stats(self):
+        """
+        Returns: :dict - field -> stats, for parsers that collect stats
+        """
+        return dict((field, parser.stats) for field, parser in iter(self.plan.parsers.items())
+                    if hasattr(parser, 'stats'))
+
+    def get_dependency(self, file_name, rk=None, lookup=None):
+        """
+        Loader of `file_name` dataset. Pass `rk` (and `lookup`) if the dataset is used only to lookup
+        objects by relative key, so it can be loaded with projection.
+        """
+        return self.context.dependencies.get(file_name, rk=rk, lookup=lookup)
 
     def get_rk(self, rk, value, many=False, raw_data=False):
         """
@@ -195,115 +513,326 @@ class TransferData(BaseLoader):
         if rk is None:
             raise InvalidManifest("Can't lookup. 'rk_lookup' field is required")
         if self.__indices.get(rk) is None:
-            indexed_by_rk = defaultdict(list)
-            for item in self.data:
-                rk_val = item
-                for p in rk.split('.'):
-                    rk_val = rk_val[p]
-                indexed_by_rk[rk_val].append(item)
+            indexed_by_rk = self.context.make_rk_index(self.data, rk)
+            if indexed_by_rk is None:
+                indexed_by_rk = defaultdict(list)
+                for item in self.data:
+                    rk_val = item
+                    for p in rk.split('.'):
+                        rk_val = rk_val[p]
+                    indexed_by_rk[rk_val].append(item)
             self.__indices[rk] = indexed_by_rk
         indexed_by_rk = self.__indices[rk]
         if many:
             values = []
             for val in value:
-                values.extend(indexed_by_rk.get(val))
+                values.extend(self._get_rk_values(rk, indexed_by_rk, val, raw_data=raw_data))
         else:
-            values = indexed_by_rk.get(value)
+            values = self._get_rk_values(rk, indexed_by_rk, value, raw_data=raw_data)
 
         if values is None:
             return None
 
-        if not raw_data:
-            values = [self._to_internal(v) for v in values]
-
         if len(values) == 1:
             return values if many else values[0]
         elif len(values) > 1:
             if many:
                 return values
-            raise ValueError("Multiple {} relative keys found: {}".format(rk,
-                                                                          ",".join(values)))
+            raise ValueError("Multiple {} relative keys found: {}".format(rk, ",".join(str(v) for v in values)))
 
-    def get_rk_obj(self, *args, **kwargs):
-        kwargs['raw_data'] = False
-        lookup_overwrite = kwargs.pop('lookup', None)
-        rk_values = self.get_rk(*args, **kwargs)
-        if rk_values is None:
+    def _get_rk_values(self, rk, indexed_by_rk, value, raw_data=False):
+        """
+        Items found by one relative key value, converted to internal values unless `raw_data`.
+        Converted items are memoized, so every relative key value is converted once.
+        """
+        if raw_data:
+            return indexed_by_rk.get(value)
+        rk_internals = self.__rk_internals.get(rk)
+        if rk_internals is None:
+            rk_internals = self.__rk_internals[rk] = self.context.make_rk_cache()
+        try:
+            values = rk_internals.get(value)
+        except TypeError:
+            # unhashable value
+            return indexed_by_rk.get(value)
+        if values is None:
+            values = indexed_by_rk.get(value)
+            if values is None:
+                return None
+            values = [self._to_internal(v) for v in values]
+            rk_internals.set(value, values)
+        return list(values)
+
+    def _rk_objects(self, rk, lookup=None):
+        """
+        Cache of resolved relative key objects: rk value -> instance
+        """
+        if isinstance(lookup, list):
+            lookup = tuple(lookup)
+        rk_objects = self.__rk_objects.get((rk, lookup))
+        if rk_objects is None:
+            rk_objects = self.__rk_objects[(rk, lookup)] = self.context.make_rk_cache()
+        return rk_objects
+
+    def prefetch_rk_objs(self, rk, values, lookup=None):
+        """
+        Resolve many relative key values with one query and cache the objects for later `get_rk_obj` calls.
+        Values that can't be resolved are left for `get_rk_obj` to report.
+
+        Returns: :dict - value -> instance of all the resolved values, to be passed to `get_rk_obj` as `prefetched`,
+            so the values of a batch are found even if the bounded cache (see `RK_CACHE_SIZE`) can't hold them
+        """
+        rk_objects = self._rk_objects(rk, lookup)
+        prefetched = {}
+        pending = {}
+        for value in values:
+            try:
+                if value in prefetched or value in pending:
+                    continue
+                obj = rk_objects.get(value)
+            except TypeError:
+                # unhashable value
+                continue
+            if obj is not None:
+                prefetched[value] = obj
+                continue
+            try:
+                rk_values = self.get_rk(rk, value)
+            except ValueError:
+                continue
+            if rk_values is not None:
+                pending[value] = self._lookup_by(rk_values, lookup)
+        if not pending:
+            return prefetched
+        objects = self._get_many(pending.values())
+        for value, lookup_kwargs in iter(pending.items()):
+            obj = objects.get(self._lookup_key(lookup_kwargs))
+            if obj is not None:
+                prefetched[value] = obj
+                rk_objects.set(value, obj)
+        return prefetched
+
+    def close(self):
+        """
+        Close the on-disk relative key indices (see `RK_INDEX`), they are opened again if the loader is used.
+        """
+        for index in iter(self.__indices.values()):
+            if isinstance(index, RKIndex):
+                index.close()
+
+    def invalidate_objects(self):
+        """
+        Forget the resolved relative key objects and the converted items, that may refer to objects saved
+        by a rolled back transaction.
+        """
+        self.__rk_objects.clear()
+        self.__rk_internals.clear()
+        for parser in iter(self.plan.parsers.values()):
+            if getattr(parser, 'prefetched', None) is not None:
+                parser.prefetched = None
+
+    def _get_cached_value(self, rk_objects, value, prefetched=None):
+        try:
+            if prefetched is not None:
+                obj = prefetched.get(value)
+                if obj is not None:
+                    return obj
+            return rk_objects.get(value)
+        except TypeError:
+            # unhashable value
             return None
-        many = isinstance(rk_values, list)
+
+    def _get_cached_rk_obj(self, rk, value, many=False, lookup=None, prefetched=None):
+        rk_objects = self._rk_objects(rk, lookup)
         if many:
-            objects = []
-            for item in rk_values:
-                lookup_kwargs = self._lookup_by(item, lookup_overwrite)
-                objects.append(self._get(lookup_kwargs))
-            return objects
-        lookup_kwargs = self._lookup_by(rk_values, lookup_overwrite)
-        return self._get(lookup_kwargs)
+            objects = [self._get_cached_value(rk_objects, val, prefetched) for val in value]
+            if all(obj is not None for obj in objects):
+                return objects
+            return None
+        return self._get_cached_value(rk_objects, value, prefetched)
+
+    def get_rk_obj(self, rk, value, many=False, lookup=None, prefetched=None):
+        """
+        Object found by relative key `value` (a list of objects if `many`), or None if the value is not in the data.
+
+        `prefetched` - value -> instance, returned by `prefetch_rk_objs`
+        """
+        cached = self._get_cached_rk_obj(rk, value, many=many, lookup=lookup, prefetched=prefetched)
+        if cached is not None:
+            return cached
+        if many:
+            return self._get_rk_objs(rk, value, lookup=lookup, prefetched=prefetched)
+        rk_values = self.get_rk(rk, value, many=many, raw_data=False)
+        if rk_values is None:
+            return None
+        lookup_kwargs = self._lookup_by(rk_values, lookup)
+        obj = self._get(lookup_kwargs)
+        try:
+            self._rk_objects(rk, lookup).set(value, obj)
+        except TypeError:
+            pass
+        return obj
+
+    def _get_rk_objs(self, rk, values, lookup=None, prefetched=None):
+        """
+        Objects found by a list of relative key values, the values that are not cached are resolved
+        with one query and cached.
+        """
+        rk_objects = self._rk_objects(rk, lookup)
+        # (value, objects if cached, lookup kwargs of the items found by the value otherwise)
+        found = []
+        for value in values:
+            obj = self._get_cached_value(rk_objects, value, prefetched)
+            if obj is not None:
+                found.append((value, [obj], None))
+                continue
+            rk_values = self.get_rk(rk, [value], many=True, raw_data=False)
+            if rk_values:
+                found.append((value, None, [self._lookup_by(item, lookup) for item in rk_values]))
+        if not found:
+            return None
+        objects = self._get_many([lookup_kwargs for _, _, lookups in found if lookups for lookup_kwargs in lookups])
+        result = []
+        for value, objs, lookups in found:
+            if objs is None:
+                objs = []
+                for lookup_kwargs in lookups:
+                    obj = objects.get(self._lookup_key(lookup_kwargs))
+                    if obj is None:
+                        raise self.model.DoesNotExist("{} matching query does not exist: {}".format(
+                            self.model._meta.object_name, lookup_kwargs))
+                    objs.append(obj)
+                if len(objs) == 1:
+                    try:
+                        rk_objects.set(value, objs[0])
+                    except TypeError:
+                        pass
+            result.extend(objs)
+        return result
+
+    def _prefetch(self, items, plan=None):
+        """
+        Let parsers prepare for a batch of items, ex. resolve relative keys with one query per dependency.
+        """
+        for field_plan in (plan or self.plan).fields or ():
+            if not hasattr(field_plan.parser, 'prefetch'):
+                continue
+            field_plan.parser.prefetch([self._get_value(item, field_plan.path) for item in items])
 
     def _get_model(self, label):
         assert label is not None, "manifest must define 'model'"
-        app_label, app_model = label.split('.')
-        model = get_model(app_label, app_model)
-        return model
+        return self.context.get_model(label)
+
+    def compile_manifest(self, fields=None, exclude=()):
+        """
+        Compile the manifest into a `ManifestPlan`, so the mapping and parsers are not looked up for every item.
+        Note: the plan is compiled on init and before every `import_data`, changes to the manifest made
+        in between are not picked up by `import_item`.
+
+        `fields` - compile only these fields, `exclude` - leave these fields out
+        """
+        mapping = self.get_manifest_value('mapping')
+        manifest_parsers = self.manifest.get('parsers', {})
+        selected = [allowed for allowed in (self.fields, fields) if allowed is not None]
+        if selected or exclude:
+            def is_selected(field):
+                return field not in exclude and all(field in allowed for allowed in selected)
+            if mapping is not None:
+                mapping = dict((field, path) for field, path in iter(mapping.items()) if is_selected(field))
+            manifest_parsers = dict((field, parser) for field, parser in iter(manifest_parsers.items())
+                                    if is_selected(field))
+        parsers = {}
+        for field, field_parser in iter(manifest_parsers.items()):
+            parsers[field] = self._compile_parser(field, field_parser)
+        fields = None
+        if mapping is not None:
+            fields = []
+            for field in mapping.keys():
+                if not isinstance(field, six.string_types):
+                    raise TransferValidationError("\"mapping\" improperly configured")
+                fields.append(FieldPlan(field=field,
+                                        path=tuple(mapping[field].split('.')),
+                                        nullable=self._field_is_nullable(field),
+                                        parser=parsers.get(field),
+                                        options=manifest_parsers.get(field)))
+            fields = tuple(fields)
+        m2m_fields = frozenset(self.get_manifest_value('m2m_fields', default=[]))
+        return ManifestPlan(fields=fields, parsers=parsers, m2m_fields=m2m_fields)
+
+    def _compile_parser(self, field, field_parser):
+        field_type = field_parser.get('type')
+        parser_class = self.parser_classes.get(field_type)
+        if parser_class is None:
+            raise ValueError("'{}' field type is not supported".format(field_type))
+        return parser_class(self, field, field_parser)
 
     def _to_internal_type(self, field, value):
-        parsers = self.manifest.get('parsers', {})
-        field_parser = parsers.get(field)
-        if field_parser is None:
+        parser = self.plan.parsers.get(field)
+        if parser is None:
             return value
-        field_type = field_parser.get('type')
-        if field_type == 'string':
-            return str(value)
-        elif field_type == 'integer':
-            return int(value)
-        elif field_type == 'boolean':
-            invert = field_parser.get('invert', False)
-            return not bool(value) if invert else bool(value)
-        elif field_type == 'datetime':
-            dt = dateutil.parser.parse(value)
-            return dt
-        elif field_type == 'relative_key':
-            dependency = self.get_dependency(field_parser.get('data_name'))
-            fk_obj = dependency.get_rk_obj(rk=field_parser.get('rk_lookup', self.get_manifest_value('pk')),
-                                           value=value,
-                                           many=field_parser.get('many', False),
-                                           lookup=field_parser.get('lookup'))
-            if fk_obj is None and not self._field_is_nullable(field):
-                raise RelativeKeyDoesNotExist("Can't find related object by key: {}".format(value))
-            return fk_obj
-        elif field_type == 'relative_object':
-            data_name = field_parser.get('data_name')
-            manifest = field_parser.get('manifest')
-            return self._handle_relative_objects(value, data_name=data_name,
-                                                 manifest=manifest, many=field_parser.get('many', False))
-
-        raise ValueError("'{}' field type is not supported".format(field_type))
+        return parser(value)
 
     def _handle_relative_objects(self, data, data_name=None, manifest=None, many=False):
-        dt = TransferData(data=data, manifest=manifest, data_name=data_name)
+        dt = self.context.get_loader(data_name=data_name, manifest=manifest)
         if many:
-            return dt.import_data(write_to_std_out=False)
-        else:
-            return dt.import_item(data, dt.get_manifest_value('update', True),
-                                  dt.get_manifest_value('skip_integrity_errors', False))[0]
+            assert isinstance(data, list), "Data must be a list, got {} instead.".format(type(data))
+            return dt.import_items(data)
+        skip_integrity_errors = dt.get_manifest_value('skip_integrity_errors', False)
+        import_item = dt._import_item_atomic if skip_integrity_errors and dt._in_transaction() else dt.import_item
+        return import_item(data, dt.get_manifest_value('update', True), skip_integrity_errors)[0]
+
+    def _in_transaction(self):
+        """
+        Whether the objects are saved within a transaction, ex. relative objects of an item imported
+        with `transaction_batch_size`. Integrity errors must be rolled back to a savepoint in this case,
+        otherwise the transaction can't be used any more (ex. on PostgreSQL).
+        """
+        return transaction.get_connection(router.db_for_write(self.model)).in_atomic_block
+
+    def _rk_lookup(self, field_parser):
+        return field_parser.get('rk_lookup', self.get_manifest_value('pk'))
+
+    def _get_value(self, item, path):
+        raw_value = item
+        for p in path:
+            raw_value = raw_value.get(p, {})
+        return raw_value
 
     def _to_internal(self, item):
-        internal = self.get_manifest_value('mapping')
-        assert internal is not None, "manifest must define 'mapping'"
+        fields = self.plan.fields
+        assert fields is not None, "manifest must define 'mapping'"
         final_internal = {}
-        for field in internal.keys():
-            if not isinstance(field, six.string_types):
-                raise TransferValidationError("\"mapping\" improperly configured")
-            mapping_path = internal[field].split('.')
+        for field_plan in fields:
             raw_value = item
-            for p in mapping_path:
+            for p in field_plan.path:
                 raw_value = raw_value.get(p, {})
-            if not self._field_is_nullable(field):
-                assert raw_value is not None, "Invalid mapping '{}'".format(internal[field])
-            internal_value = self._to_internal_type(field, raw_value)
-            final_internal[field] = internal_value
+            if not field_plan.nullable:
+                assert raw_value is not None, "Invalid mapping '{}'".format('.'.join(field_plan.path))
+            if field_plan.parser is not None:
+                raw_value = field_plan.parser(raw_value)
+            final_internal[field_plan.field] = raw_value
         return final_internal
 
+    def _to_internal_many(self, items, plan=None):
+        """
+        Convert a list of items field by field, so parsers can convert all values at once with `parse_many`.
+        """
+        fields = (plan or self.plan).fields
+        assert fields is not None, "manifest must define 'mapping'"
+        final_internals = [{} for _ in items]
+        for field_plan in fields:
+            raw_values = [self._get_value(item, field_plan.path) for item in items]
+            if not field_plan.nullable:
+                for raw_value in raw_values:
+                    assert raw_value is not None, "Invalid mapping '{}'".format('.'.join(field_plan.path))
+            if hasattr(field_plan.parser, 'parse_many'):
+                raw_values = field_plan.parser.parse_many(raw_values)
+            elif field_plan.parser is not None:
+                raw_values = [field_plan.parser(raw_value) for raw_value in raw_values]
+            for final_internal, value in zip(final_internals, raw_values):
+                final_internal[field_plan.field] = value
+        return final_internals
+
     def _lookup_by(self, data, lookup_overwrite=None):
         lookup_fields = self.get_manifest_value('lookup')
         if lookup_overwrite is not None:
@@ -323,14 +852,12 @@ class TransferData(BaseLoader):
 
     def _m2m(self, data):
         # m2m_fields = M2M.get(self.get_manifest_value('model'), [])
-        m2m_fields = self.get_manifest_value('m2m_fields', default=[])
         m2m_data = {}
-        for f in m2m_fields:
+        for f in self.plan.m2m_fields:
             m2m_data[f] = data.pop(f, None)
         return data, m2m_data
 
     def _m2m_fill(self, obj, fields, m2m_clear=True):
-        # TODO: make m2m_clear configurable in manifest
         for field, m2m_array in iter(fields.items()):
             if m2m_array is None:
                 continue
@@ -343,33 +870,161 @@ class TransferData(BaseLoader):
             m2m_field.add(*m2m_array)
         return obj
 
-    def _update_or_create(self, lookup_kwargs, data, m2m_clear=True):
-        # TODO: make m2m_clear configurable in manifest
+    def _m2m_through(self, field_name):
+        """
+        Returns: :tuple (through model, source attname, target attname, target pk field) of a many-to-many field
+            with auto-created through model, or None if the field is written by the related manager
+        """
+        if field_name not in self.__m2m_through:
+            through = None
+            try:
+                field = self.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                field = None
+            if isinstance(field, models.ManyToManyField):
+                remote_field = get_remote_field(field)
+                opts = remote_field.through._meta
+                # symmetrical relations are written in both directions by the related manager
+                if opts.auto_created and not getattr(remote_field, 'symmetrical', False):
+                    through = (remote_field.through,
+                               opts.get_field(field.m2m_field_name()).attname,
+                               opts.get_field(field.m2m_reverse_field_name()).attname,
+                               remote_field.model._meta.pk)
+            self.__m2m_through[field_name] = through
+        return self.__m2m_through[field_name]
+
+    def _m2m_bulk_fill(self, pairs, m2m_clear=None):
+        """
+        Write many-to-many data of many objects. Per field, existing through rows of all the objects are fetched
+        with one query, then stale relations are deleted with one query and missing relations are inserted
+        with one `bulk_create`. Unchanged relations are kept.
+
+        `pairs` - a list of (instance, m2m data) tuples
+        `m2m_clear` - replace the relations (True) or append to them (False), defaults to `m2m_mode` manifest value
+        """
+        if m2m_clear is None:
+            m2m_clear = self.get_manifest_value('m2m_mode') == 'replace'
+        batch_size = self.get_manifest_value('batch_size')
+        for field_name in self.plan.m2m_fields:
+            field_pairs = [(obj, m2m_data[field_name]) for obj, m2m_data in pairs
+                           if m2m_data.get(field_name) is not None]
+            if not field_pairs:
+                continue
+            through = self._m2m_through(field_name)
+            if through is None:
+                for obj, m2m_array in field_pairs:
+                    self._m2m_fill(obj, {field_name: m2m_array}, m2m_clear=m2m_clear)
+                continue
+            through_model, source, target, target_pk = through
+
+            # source pk -> target pks, in order
+            # primary keys are normalized, so they match the values of the through rows, ex. "10" and 10
+            source_pk_field = self.model._meta.pk
+            wanted = {}
+            for obj, m2m_array in field_pairs:
+                obj_pk = source_pk_field.to_python(obj.pk)
+                if m2m_clear or obj_pk not in wanted:
+                    wanted[obj_pk] = []
+                targets = wanted[obj_pk]
+                for value in m2m_array:
+                    value = target_pk.to_python(value.pk if isinstance(value, models.Model) else value)
+                    if value not in targets:
+                        targets.append(value)
+
+            existing = defaultdict(set)
+            stale = []
+            rows = through_model.objects.filter(**{source + '__in': list(wanted.keys())}).values_list(
+                'pk', source, target)
+            for pk, source_pk, target_pk_value in rows:
+                source_pk = source_pk_field.to_python(source_pk)
+                target_pk_value = target_pk.to_python(target_pk_value)
+                if m2m_clear and target_pk_value not in wanted[source_pk]:
+                    stale.append(pk)
+                else:
+                    existing[source_pk].add(target_pk_value)
+            for stale_pks in chunks(stale, batch_size):
+                through_model.objects.filter(pk__in=stale_pks).delete()
+            through_model.objects.bulk_create(
+                [through_model(**{source: source_pk, target: target_pk_value})
+                 for source_pk, targets in iter(wanted.items())
+                 for target_pk_value in targets if target_pk_value not in existing[source_pk]],
+                batch_size=batch_size)
+
+    def _update_or_create(self, lookup_kwargs, data, m2m_clear=None):
         data = self._apply_adaptors(data)
         data, m2m_data = self._m2m(data)
         obj, _ = self.model_handler.update_or_create(self.model, data, lookup_kwargs)
         obj = self._post_save(obj, data, m2m_data)
-        obj = self._m2m_fill(obj, m2m_data, m2m_clear=m2m_clear)
+        self._m2m_bulk_fill([(obj, m2m_data)], m2m_clear=m2m_clear)
         return obj, _
 
-    def _create(self, model, data, m2m_clear=False):
+    def _update_changed(self, lookup_kwargs, data, m2m_clear=None):
+        """
+        Same as `_update_or_create`, but an existing object is saved only if the data changes it,
+        and only the changed fields are saved. Unchanged objects are counted by `report.unchanged`.
+        """
+        obj = self._get_or_none(lookup_kwargs)
+        if obj is None:
+            return self._update_or_create(lookup_kwargs, data, m2m_clear=m2m_clear)
+        data = self._apply_adaptors(data)
+        data, m2m_data = self._m2m(data)
+        changed = self._changed_fields(obj, data)
+        if changed:
+            obj = self._handler_update(obj, lookup_kwargs, data, changed)
+            obj = self._post_save(obj, data, m2m_data)
+        else:
+            self.report.unchanged += 1
+        self._m2m_bulk_fill([(obj, m2m_data)], m2m_clear=m2m_clear)
+        return obj, False
+
+    def _handler_update(self, obj, lookup_kwargs, data, update_fields):
+        """
+        Save `update_fields` of an existing object with `update` of the model handler, or with its
+        `update_or_create` if the handler does not define `update` (custom handlers may not).
+
+        Returns: :instance - saved model instance
+        """
+        update = getattr(self.model_handler, 'update', None)
+        if update is None:
+            return self.model_handler.update_or_create(self.model, data, lookup_kwargs)[0]
+        return update(self.model, obj, data, update_fields)
+
+    def _changed_fields(self, obj, data):
+        """
+        Returns: :list of the fields of `data` that differ from the values of `obj`
+        """
+        changed = []
+        for field_name in self._update_fields(data):
+            value = data[field_name]
+            try:
+                field = self.model._meta.get_field(field_name)
+                if isinstance(value, models.Model):
+                    value = value.pk
+                if getattr(obj, field.attname) == field.to_python(value):
+                    continue
+            except (FieldDoesNotExist, AttributeError, ValidationError):
+                pass
+            changed.append(field_name)
+        return changed
+
+    def _create(self, model, data, m2m_clear=None):
         data = self._apply_adaptors(data)
         data, m2m_data = self._m2m(data)
         obj = self.model_handler.create(model, data)
         obj = self._post_save(obj, data, m2m_data)
-        obj = self._m2m_fill(obj, m2m_data)
+        self._m2m_bulk_fill([(obj, m2m_data)], m2m_clear=m2m_clear)
         return obj
 
     def _get(self, lookup_kwargs):
         return self.model_handler.get(self.model, lookup_kwargs)
 
-    def _get_or_create(self, lookup_kwargs, data, m2m_clear=True):
+    def _get_or_create(self, lookup_kwargs, data, m2m_clear=None):
         data = self._apply_adaptors(data)
         data, m2m_data = self._m2m(data)
         obj, _ = self.model_handler.get_or_create(self.model, data, lookup_kwargs)
         if _:
             obj = self._post_save(obj, data, m2m_data)
-            obj = self._m2m_fill(obj, m2m_data, m2m_clear=m2m_clear)
+            self._m2m_bulk_fill([(obj, m2m_data)], m2m_clear=m2m_clear)
         return obj, _
 
     def _get_or_none(self, lookup_kwargs):
@@ -378,13 +1033,24 @@ class TransferData(BaseLoader):
         except self.model.DoesNotExist:
             return None
 
-    def import_item(self, item, update=False, skip_integrity_errors=False):
+    def import_item(self, item, update=False, skip_integrity_errors=False, existing=None):
+        """
+        `existing` - lookup key -> instance (or None if the object does not exist) preloaded for a batch of items,
+            see `_preload`. Objects of the preloaded keys are not looked up again, created objects are added.
+        """
         to_internal = self._to_internal(item)
 
         lookup_kwargs = self._lookup_by(to_internal)
+        key = None
         try:
             if lookup_kwargs is not None:
-                if update:
+                if existing is not None:
+                    key = self._lookup_key(lookup_kwargs)
+                if key is not None and key in existing:
+                    obj, _created = self._save_preloaded(key, lookup_kwargs, to_internal, existing, update=update)
+                elif update and self.get_manifest_value('skip_unchanged'):
+                    obj, _created = self._update_changed(lookup_kwargs, to_internal)
+                elif update:
                     obj, _created = self._update_or_create(lookup_kwargs, to_internal)
                 else:
                     obj, _created = self._get_or_create(lookup_kwargs, to_internal)
@@ -393,27 +1059,443 @@ class TransferData(BaseLoader):
                 obj = self._create(self.model, to_internal)
                 return obj, True
         except IntegrityError as e:
+            if key is not None:
+                # the saved state of the object is unknown, look it up again
+                existing.pop(key, None)
             if skip_integrity_errors:
                 self.report.exceptions['IntegrityError'].append(e)
             else:
                 raise e
             return None, None
 
-    def import_data(self, write_to_std_out=False):
-        self.valid(silent=False)
+    def _save_preloaded(self, key, lookup_kwargs, data, existing, update=False):
+        """
+        Same as `_update_or_create` (`_update_changed` with `skip_unchanged`) or `_get_or_create`, but the existing
+        object is taken from `existing` instead of a query. Existing objects are saved with `update_fields`.
+        """
+        obj = existing[key]
+        if obj is None:
+            obj = self._create(self.model, data)
+            existing[key] = obj
+            return obj, True
+        if not update:
+            return obj, False
+        data = self._apply_adaptors(data)
+        data, m2m_data = self._m2m(data)
+        if self.get_manifest_value('skip_unchanged'):
+            fields = self._changed_fields(obj, data)
+            if not fields:
+                self.report.unchanged += 1
+        else:
+            fields = self._update_fields(data)
+        if fields:
+            obj = self._handler_update(obj, lookup_kwargs, data, fields)
+            obj = self._post_save(obj, data, m2m_data)
+        self._m2m_bulk_fill([(obj, m2m_data)])
+        return obj, False
+
+    def _preload(self, items):
+        """
+        Existing objects of a batch of items, fetched with one query (see `_get_many`) instead of a query per item.
+        Only the lookup fields of the items are converted.
+
+        Returns: :dict - lookup key -> instance or None, or None if the objects can't be preloaded
+        """
+        lookup_fields = self._lookup_fields()
+        if not lookup_fields or self.plan.fields is None:
+            return None
+        if self._handler_overrides('get', 'get_or_create', 'update_or_create'):
+            # custom lookups of the model handler are called item by item
+            return None
+        if self.__lookup_plan is None or self.__lookup_plan[0] is not self.plan:
+            self.__lookup_plan = (self.plan, self.compile_manifest(fields=lookup_fields))
+        plan = self.__lookup_plan[1]
+        if any(field_plan.options and field_plan.options.get('type') == 'relative_object'
+               for field_plan in plan.fields or ()):
+            # converting the lookup would save the related objects
+            return None
+        try:
+            self._prefetch(items, plan=plan)
+            lookups = [self._lookup_by(to_internal) for to_internal in self._to_internal_many(items, plan=plan)]
+        except Exception:
+            # the failing item raises the error when it is imported, after the items before it are saved
+            return None
+        existing = dict((self._lookup_key(lookup_kwargs), None) for lookup_kwargs in lookups)
+        existing.update(self._get_many(lookups))
+        return existing
+
+    def _handler_overrides(self, *names):
+        """
+        Returns: :bool - whether the model handler does not use `ModelHandler` implementation of any of the methods
+        """
+        handler_class = type(self.model_handler)
+        for name in names:
+            method = getattr(handler_class, name, None)
+            if method is None or six.get_unbound_function(method) is not six.get_unbound_function(
+                    getattr(ModelHandler, name)):
+                return True
+        return False
+
+    def _lookup_value(self, field_name, value):
+        """
+        Normalize lookup value, so the values from data and the values from database compare equal.
+        """
+        if isinstance(value, models.Model):
+            value = value.pk
+        try:
+            field = self.model._meta.pk if field_name == 'pk' else self.model._meta.get_field(field_name)
+            return field.to_python(value)
+        except (FieldDoesNotExist, ValidationError):
+            return value
+
+    def _lookup_key(self, lookup_kwargs):
+        return tuple((field, self._lookup_value(field, value)) for field, value in sorted(lookup_kwargs.items()))
+
+    def _object_key(self, obj, lookup_fields):
+        values = {}
+        for field_name in lookup_fields:
+            if field_name == 'pk':
+                values[field_name] = obj.pk
+            else:
+                values[field_name] = getattr(obj, self.model._meta.get_field(field_name).attname)
+        return self._lookup_key(values)
+
+    def _get_many(self, lookups):
+        """
+        Fetch existing objects for a list of lookup kwargs in one query, with `bulk_get` of the model handler.
+
+        Returns: :dict - lookup key -> instance
+        """
+        lookups = [lookup_kwargs for lookup_kwargs in lookups if lookup_kwargs is not None]
+        if not lookups:
+            return {}
+        lookup_fields = sorted(lookups[0].keys())
+        bulk_get = getattr(self.model_handler, 'bulk_get', None)
+        if bulk_get is not None:
+            objs = bulk_get(self.model, lookups)
+        else:
+            # custom model handlers may not define `bulk_get`, the objects are looked up one by one
+            objs = []
+            for lookup_kwargs in lookups:
+                try:
+                    objs.append(self.model_handler.get(self.model, lookup_kwargs))
+                except self.model.DoesNotExist:
+                    pass
+        return dict((self._object_key(obj, lookup_fields), obj) for obj in objs)
+
+    def _update_fields(self, data):
+        pk_names = ('pk', self.model._meta.pk.name)
+        return [field for field in data.keys() if field not in pk_names]
+
+    def _bulk_write(self, to_create, to_update, update_fields):
+        """
+        Save new objects with `bulk_create` and existing objects with `bulk_update`.
+        `to_create` is a list of (instance, lookup_kwargs) tuples.
+        """
+        batch_size = self.get_manifest_value('batch_size')
+        if self._can_bulk_upsert(to_create):
+            # one `INSERT ... ON CONFLICT` statement per batch for both new and existing objects
+            concrete_fields = self.model._meta.concrete_fields
+            rows = [dict((field.attname, getattr(obj, field.attname)) for field in concrete_fields)
+                    for obj in [obj for obj, _ in to_create] + to_update]
+            self.model_handler.bulk_upsert(self.model, rows, self._lookup_fields(), update_fields,
+                                           batch_size=batch_size)
+        else:
+            if not can_return_bulk_pks():
+                # primary keys can't be recovered for objects without lookup, save them one by one
+                for obj, lookup_kwargs in to_create:
+                    if lookup_kwargs is None:
+                        obj.save()
+                to_create = [(obj, lookup_kwargs) for obj, lookup_kwargs in to_create if lookup_kwargs is not None]
+            self.model.objects.bulk_create([obj for obj, _ in to_create], batch_size=batch_size)
+            bulk_update(self.model, to_update, update_fields, batch_size=batch_size)
+        missing_pk = [(obj, lookup_kwargs) for obj, lookup_kwargs in to_create if obj.pk is None]
+        if missing_pk:
+            saved = self._get_many([lookup_kwargs for _, lookup_kwargs in missing_pk])
+            for obj, lookup_kwargs in missing_pk:
+                obj.pk = saved[self._lookup_key(lookup_kwargs)].pk
+
+    def _can_bulk_upsert(self, to_create):
+        """
+        Whether the model handler can save the objects with `bulk_upsert`, see `ModelHandler.can_bulk_upsert`.
+        """
+        lookup_fields = self._lookup_fields()
+        can_bulk_upsert = getattr(self.model_handler, 'can_bulk_upsert', None)
+        if not lookup_fields or can_bulk_upsert is None or not hasattr(self.model_handler, 'bulk_upsert'):
+            return False
+        if any(lookup_kwargs is None for _, lookup_kwargs in to_create):
+            return False
+        return can_bulk_upsert(self.model, lookup_fields)
+
+    def import_batch(self, items, update=False):
+        """
+        Import a list of items with one `bulk_create` and one `bulk_update` call.
+
+        Returns: :tuple (list of instances, number of created, number of updated, number of unchanged)
+        """
+        skip_unchanged = self.get_manifest_value('skip_unchanged')
+        self._prefetch(items)
+        internals = self._to_internal_many(items)
+        lookups = [self._lookup_by(to_internal) for to_internal in internals]
+        rows = []
+        for lookup_kwargs, data in zip(lookups, self._apply_adaptors_batch(internals)):
+            data, m2m_data = self._m2m(data)
+            rows.append((lookup_kwargs, data, m2m_data))
+
+        created = updated = unchanged = 0
+        # the lookup values of existing objects already match, the raw values from the data are not copied to them
+        identity_fields = set(['pk', self.model._meta.pk.name] + (self._lookup_fields() or []))
+        # existing objects by lookup, new objects are added as well to keep duplicates from being created twice
+        objects = self._get_many([lookup_kwargs for lookup_kwargs, _, _ in rows])
+        to_create = []
+        to_update = []
+        to_update_ids = set()
+        update_fields = []
+        results = []
+        # unchanged objects, only their many-to-many relations are written
+        m2m_only = []
+        for lookup_kwargs, data, m2m_data in rows:
+            key = self._lookup_key(lookup_kwargs) if lookup_kwargs is not None else None
+            obj = objects.get(key) if key is not None else None
+            if obj is None:
+                params = dict(lookup_kwargs or {})
+                params.update(data)
+                obj = self.model(**params)
+                to_create.append((obj, lookup_kwargs))
+                if key is not None:
+                    objects[key] = obj
+                created += 1
+                results.append((obj, data, m2m_data, True))
+                continue
+            if update:
+                fields = self._changed_fields(obj, data) if skip_unchanged else self._update_fields(data)
+                if not fields:
+                    unchanged += 1
+                    results.append((obj, data, m2m_data, False))
+                    m2m_only.append((obj, m2m_data))
+                    continue
+                for field, value in iter(data.items()):
+                    if field not in identity_fields:
+                        setattr(obj, field, value)
+                for field in fields:
+                    if field not in update_fields:
+                        update_fields.append(field)
+                if obj.pk is not None and id(obj) not in to_update_ids:
+                    to_update.append(obj)
+                    to_update_ids.add(id(obj))
+                updated += 1
+            results.append((obj, data, m2m_data, update))
+
+        self._bulk_write(to_create, to_update, update_fields)
+
+        saved = [(obj, data, m2m_data) for obj, data, m2m_data, is_saved in results if is_saved]
+        if saved:
+            saved_objs, datas, m2m_datas = [list(values) for values in zip(*saved)]
+            self._post_save_batch(saved_objs, datas, m2m_datas)
+        self._m2m_bulk_fill([(obj, m2m_data) for obj, _, m2m_data in saved] + m2m_only)
+        objs = [obj for obj, _, _, _ in results]
+        return objs, created, updated, unchanged
+
+    def _import_item_atomic(self, item, update=False, skip_integrity_errors=False, existing=None):
+        try:
+            with transaction.atomic():
+                return self.import_item(item, update=update, existing=existing)
+        except IntegrityError as e:
+            self._rolled_back()
+            if skip_integrity_errors:
+                self.report.exceptions['IntegrityError'].append(e)
+            else:
+                raise e
+            return None, None
+
+    def _bulk_import_data(self, items, write_to_std_out=False, keep_objects=True):
+        update = self.get_manifest_value('update', default=True)
         skip_integrity_errors = self.get_manifest_value('skip_integrity_errors', False)
         objs = []
-        for item in self.data:
-            self.report.item += 1
-            obj, _created = self.import_item(item,
-                                             update=self.get_manifest_value('update', default=True),
-                                             skip_integrity_errors=skip_integrity_errors)
-            objs.append(obj)
-            if _created:
-                self.report.created += 1
-            elif self.get_manifest_value('update'):
-                self.report.updated += 1
+        for batch in chunks(items, self.get_manifest_value('batch_size')):
+            try:
+                with transaction.atomic():
+                    batch_objs, created, updated, unchanged = self.import_batch(batch, update=update)
+            except IntegrityError as e:
+                if not skip_integrity_errors:
+                    raise e
+                self._rolled_back()
+                # isolate failing items by importing the batch item by item
+                batch_objs, created, updated, unchanged = [], 0, 0, 0
+                for item in batch:
+                    report_unchanged = self.report.unchanged
+                    obj, _created = self._import_item_atomic(item, update=update,
+                                                             skip_integrity_errors=skip_integrity_errors)
+                    batch_objs.append(obj)
+                    if _created:
+                        created += 1
+                    elif _created is not None and update and self.report.unchanged == report_unchanged:
+                        updated += 1
+            if keep_objects:
+                objs.extend(batch_objs)
+            self.report.item += len(batch)
+            self.report.created += created
+            self.report.updated += updated
+            self.report.unchanged += unchanged
+            self._committed()
 
             if write_to_std_out:
                 self.write_std_out()
+        return objs if keep_objects else None
+
+    def import_data(self, write_to_std_out=False, keep_objects=True, item_filter=None, checkpoint=None):
+        """
+        Import all items. Pass `keep_objects=False` to not keep imported objects in memory,
+        ex. when the data is streamed.
+
+        `item_filter` - a callable that takes the data items and returns the items to import,
+            ex. `loadjson.incremental.ContentHashes.filter`
+        `checkpoint` - saves the progress every time items are committed and resumes the import
+            from the last saved progress, see `loadjson.incremental.Checkpoint`
+
+        Returns: :list of imported objects (None if `keep_objects` is False)
+        """
+        self.valid(silent=False)
+        deferred_fields = self.get_manifest_value('deferred_fields')
+        self.plan = self.compile_manifest(exclude=deferred_fields)
+        data, skip = self.data, 0
+        if checkpoint is not None:
+            data, skip = checkpoint.resume(self, filtered=item_filter is not None)
+        items = item_filter(data) if item_filter is not None else data
+        if skip:
+            items = itertools.islice(items, skip, None)
+        self.checkpoint = checkpoint
+        try:
+            objs = self.import_items(items, write_to_std_out=write_to_std_out, keep_objects=keep_objects)
+        finally:
+            self.checkpoint = None
+            self.close()
+        if isinstance(data, (DataStream, LoadedData)):
+            self.report.bytes_read = data.bytes_read
+            self.report.bytes_decompressed = data.bytes_decompressed
+        if deferred_fields:
+            plan = self.plan
+            try:
+                self.import_deferred(deferred_fields)
+            finally:
+                self.plan = plan
+                self.close()
         return objs
+
+    def import_deferred(self, deferred_fields):
+        """
+        Second pass of the import: set `deferred_fields` of the imported objects, once all the items are
+        imported, so the items can refer to each other (ex. by relative keys to the dataset itself) regardless
+        of their order. Relative keys of a batch are resolved with one query per dependency, foreign keys
+        are saved with one `bulk_update` and many-to-many relations with one insert per field.
+
+        All the items of `self.data` are resolved, items that were not imported are skipped.
+        Note: the objects returned by `import_data` do not have the deferred fields set.
+        """
+        lookup_fields = self._lookup_fields()
+        # items found by relative keys to the dataset itself are converted by `self.plan`,
+        # without the deferred fields, so resolving them does not follow the references further
+        self.plan = self.compile_manifest(fields=lookup_fields)
+        plan = self.compile_manifest(fields=set(deferred_fields) | set(lookup_fields))
+        batch_size = self.get_manifest_value('batch_size')
+        for batch in chunks(self.data, batch_size):
+            self._prefetch(batch, plan=plan)
+            rows = [(self._lookup_by(to_internal), to_internal)
+                    for to_internal in self._to_internal_many(batch, plan=plan)]
+            objects = self._get_many([lookup_kwargs for lookup_kwargs, _ in rows])
+            to_update = []
+            to_update_ids = set()
+            update_fields = []
+            m2m_pairs = []
+            for lookup_kwargs, data in rows:
+                obj = objects.get(self._lookup_key(lookup_kwargs))
+                if obj is None:
+                    continue
+                data, m2m_data = self._m2m(data)
+                data = dict((field, value) for field, value in iter(data.items()) if field in deferred_fields)
+                changed = self._changed_fields(obj, data)
+                for field in changed:
+                    setattr(obj, field, data[field])
+                    if field not in update_fields:
+                        update_fields.append(field)
+                if changed and id(obj) not in to_update_ids:
+                    to_update.append(obj)
+                    to_update_ids.add(id(obj))
+                m2m_pairs.append((obj, m2m_data))
+            with transaction.atomic():
+                bulk_update(self.model, to_update, update_fields, batch_size=batch_size)
+                self._m2m_bulk_fill(m2m_pairs)
+
+    def import_items(self, items, write_to_std_out=False, keep_objects=True):
+        """
+        Import `items` with the compiled manifest, used to import data other than `self.data`,
+        ex. relative objects.
+        """
+        if self.get_manifest_value('engine') == 'bulk':
+            return self._bulk_import_data(items, write_to_std_out=write_to_std_out, keep_objects=keep_objects)
+        return self._default_import_data(items, write_to_std_out=write_to_std_out, keep_objects=keep_objects)
+
+    def _default_import_data(self, items, write_to_std_out=False, keep_objects=True):
+        transaction_batch_size = self.get_manifest_value('transaction_batch_size')
+        if transaction_batch_size is None:
+            return self._default_import_chunk(items, write_to_std_out=write_to_std_out, keep_objects=keep_objects)
+        # commit every `transaction_batch_size` items, failing items roll back to their savepoints
+        objs = []
+        for chunk in chunks(items, transaction_batch_size):
+            with transaction.atomic():
+                chunk_objs = self._default_import_chunk(chunk, write_to_std_out=write_to_std_out,
+                                                        keep_objects=keep_objects, atomic_items=True)
+            self._committed()
+            if keep_objects:
+                objs.extend(chunk_objs)
+        return objs if keep_objects else None
+
+    def _default_import_chunk(self, items, write_to_std_out=False, keep_objects=True, atomic_items=False):
+        """
+        Import `items` one by one. With `atomic_items`, the items are imported within a transaction,
+        so every item gets a savepoint if integrity errors are skipped. So do the items imported within
+        the transaction of another loader, ex. relative objects.
+        """
+        skip_integrity_errors = self.get_manifest_value('skip_integrity_errors', False)
+        import_item = self.import_item
+        if skip_integrity_errors and (atomic_items or self._in_transaction()):
+            import_item = self._import_item_atomic
+        objs = []
+        for batch in chunks(items, self.get_manifest_value('batch_size')):
+            self._prefetch(batch)
+            existing = self._preload(batch)
+            for item in batch:
+                self.report.item += 1
+                report_unchanged = self.report.unchanged
+                obj, _created = import_item(item,
+                                            update=self.get_manifest_value('update', default=True),
+                                            skip_integrity_errors=skip_integrity_errors,
+                                            existing=existing)
+                if keep_objects:
+                    objs.append(obj)
+                if _created:
+                    self.report.created += 1
+                elif self.get_manifest_value('update') and self.report.unchanged == report_unchanged:
+                    self.report.updated += 1
+
+                if write_to_std_out:
+                    self.write_std_out()
+            if not atomic_items:
+                # items are committed one by one, the progress is saved once per batch though,
+                # so the state database is not written for every item
+                self._committed()
+        return objs if keep_objects else None
+
+    def _rolled_back(self):
+        """
+        Called every time imported items are rolled back, see `LoaderContext.invalidate_objects`.
+        """
+        self.invalidate_objects()
+        self.context.invalidate_objects()
+
+    def _committed(self):
+        """
+        Called every time imported items are committed, see `Checkpoint.save`.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.save(self)
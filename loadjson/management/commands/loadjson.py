@@ -1,5 +1,10 @@
-from django.core.management.base import BaseCommand
-from ...loaders import TransferData
+import os
+from django.core.management.base import BaseCommand, CommandError
+from ...finders import DefaultDataFinder
+from ...graph import DependencyCycle, build_graph, find_data_names, get_released, topological_levels
+from ...incremental import ContentHashes, Checkpoint
+from ...loaders import TransferData, LoaderContext
+from ...workers import check_concurrent_writes, get_result, import_scheduled, import_sharded
 
 
 class Command(BaseCommand):
@@ -9,17 +14,200 @@ class Command(BaseCommand):
         # Positional arguments
         parser.add_argument('json_path',
                             type=str,
-                            help="Provide data file path")
+                            nargs='+',
+                            help="Provide data file path(s) or data directories (one of DATA_DIRS) to import all "
+                                 "the data in them. Datasets are imported after the datasets they depend on")
+        parser.add_argument('--plan',
+                            action='store_true',
+                            default=False,
+                            help="Print the order the datasets would be imported in, without importing")
+        parser.add_argument('--jobs',
+                            type=int,
+                            default=1,
+                            help="Import up to N datasets that do not depend on each other at the same time, "
+                                 "SQLite databases are not supported")
+        parser.add_argument('--stream',
+                            action='store_true',
+                            default=None,
+                            help="Read data items one by one instead of loading the whole file into memory")
+        parser.add_argument('--json-decoder',
+                            type=str,
+                            default=None,
+                            help="JSON decoder: auto, json, orjson, ujson, rapidjson or a path to decoder class")
+        parser.add_argument('--transaction-batch-size',
+                            type=int,
+                            default=None,
+                            help="Commit every N items in one transaction, overrides the manifest value")
+        parser.add_argument('--incremental',
+                            action='store_true',
+                            default=False,
+                            help="Import only the items that changed since the last successful incremental import")
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help="Resume the last import of the data if it was interrupted")
+        parser.add_argument('--workers',
+                            type=int,
+                            default=1,
+                            help="Import the data by N processes, each process imports one shard of the data. "
+                                 "The data is streamed, SQLite databases are not supported")
+        parser.add_argument('--shard-by',
+                            choices=('hash', 'range'),
+                            default=None,
+                            help="Split the data into shards by hash of the lookup values (default if the manifest "
+                                 "defines lookup) or by ranges of items")
+        parser.add_argument('--state-file',
+                            type=str,
+                            default=None,
+                            help="File to keep the state of incremental imports and the progress in, "
+                                 "overrides STATE_FILE setting")
 
     def handle(self, *args, **options):
-        data_path = options['json_path']
-        td = TransferData(data_name=data_path)
-        td.import_data(write_to_std_out=True)
+        context = LoaderContext(stream=options.get('stream'), decoder=options.get('json_decoder'))
+        try:
+            self.import_all(context, options)
+        finally:
+            context.close()
+
+    def import_all(self, context, options):
+        """
+        Import the datasets of `json_path` option in the order of their dependencies.
+        """
+        data_names = []
+        for data_path in options['json_path']:
+            if os.path.isdir(data_path):
+                data_names.extend(self.find_data_names(data_path, context))
+            else:
+                data_names.append(data_path)
+        manifest_options = {}
+        if options.get('transaction_batch_size') is not None:
+            manifest_options['transaction_batch_size'] = options['transaction_batch_size']
+
+        if len(data_names) == 1 and not options.get('plan'):
+            self.write_report(self.import_dataset(data_names[0], context, options, manifest_options))
+            return
+
+        graph = build_graph(data_names, context)
+        try:
+            levels = topological_levels(graph)
+        except DependencyCycle as e:
+            raise CommandError(str(e))
+        if options.get('plan'):
+            for number, level in enumerate(levels, 1):
+                for data_name in level:
+                    dependencies = sorted(graph[data_name])
+                    self.stdout.write("{}. {}{}".format(number, data_name, " (after: {})".format(
+                        ", ".join(dependencies)) if dependencies else ""))
+            return
+
+        jobs = options.get('jobs') or 1
+        if jobs > 1:
+            if options.get('incremental') or options.get('resume') or (options.get('workers') or 1) > 1:
+                raise CommandError("--jobs can't be combined with --incremental, --resume or --workers")
+            self.check_concurrent_writes('--jobs', sorted(graph), context)
+            results, errors = import_scheduled(graph, jobs, stream=options.get('stream'),
+                                               decoder=options.get('json_decoder'),
+                                               manifest_options=manifest_options)
+        else:
+            # datasets share the context, so the datasets imported first are reused as dependencies
+            # until no dataset left to import depends on them
+            results, errors = {}, {}
+            order = [data_name for level in levels for data_name in level]
+            for data_name, released in zip(order, get_released(order, context)):
+                self.stdout.write("IMPORT {}".format(data_name))
+                results[data_name] = self.import_dataset(data_name, context, options, manifest_options)
+                context.release(released)
+                self.stdout.write("")
+        for level in levels:
+            for data_name in level:
+                self.stdout.write("=" * 10 + " {} ".format(data_name) + "=" * 10)
+                if data_name in results:
+                    self.write_report(results[data_name])
+                else:
+                    self.stdout.write("FAILED - {}".format(errors[data_name]))
+        if errors:
+            raise CommandError("Failed to import: {}".format(", ".join(sorted(errors))))
+
+    def check_concurrent_writes(self, option, data_names, context):
+        try:
+            check_concurrent_writes(data_names, context)
+        except ValueError as e:
+            raise CommandError("{} can't be used: {}".format(option, e))
+
+    def find_data_names(self, directory, context):
+        """
+        Data names of all data files in `directory`, which must be one of `DATA_DIRS`.
+        """
+        data_dirs = [os.path.abspath(data_dir) for data_dir in context.settings.get('DATA_DIRS', [])]
+        if os.path.abspath(directory) not in data_dirs:
+            raise CommandError("{} is not one of DATA_DIRS".format(directory))
+        return find_data_names(directory, DefaultDataFinder([directory]))
+
+    def import_dataset(self, data_path, context, options, manifest_options):
+        """
+        Returns: :dict - the result of the import, see `loadjson.workers.get_result`
+        """
+        workers = options.get('workers') or 1
+        if workers > 1:
+            if options.get('incremental') or options.get('resume'):
+                raise CommandError("--workers can't be combined with --incremental or --resume")
+            manifest = context.find_data(data_path, data=False)[1] or {}
+            if manifest.get('deferred_fields'):
+                # the deferred fields may refer to the items of other shards
+                raise CommandError("--workers can't be used with 'deferred_fields'")
+            shard_by = options.get('shard_by')
+            if shard_by is None:
+                shard_by = 'hash' if manifest.get('lookup') is not None else 'range'
+            self.check_concurrent_writes('--workers', [data_path], context)
+            # the data is always streamed by the workers
+            return import_sharded(data_path, workers, shard_by=shard_by, decoder=options.get('json_decoder'),
+                                  manifest_options=manifest_options)
+
+        td = TransferData(data_name=data_path, context=context)
+        if manifest_options:
+            td.manifest = dict(td.manifest, **manifest_options)
+        state_file = options.get('state_file') or context.settings.get('STATE_FILE')
+        # the state file is used only if asked for
+        use_state = options.get('incremental') or options.get('resume') or state_file is not None
+        state_file = state_file or '.loadjson.state'
+        hashes = None
+        if options.get('incremental'):
+            hashes = ContentHashes(state_file, td, data_name=data_path, resume=options.get('resume'))
+        checkpoint = None
+        if use_state:
+            # the progress is saved every time items are committed
+            checkpoint = Checkpoint(state_file, data_name=data_path, resume=options.get('resume'))
+        try:
+            td.import_data(write_to_std_out=True, keep_objects=False,
+                           item_filter=hashes.filter if hashes is not None else None, checkpoint=checkpoint)
+            if checkpoint is not None:
+                checkpoint.clear()
+            if hashes is not None:
+                # items that failed are imported again by the next run
+                if td.report.exceptions:
+                    hashes.rollback()
+                else:
+                    hashes.commit()
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+            if hashes is not None:
+                hashes.close()
+
+        result = get_result(td, context)
+        result['resumed_from'] = checkpoint.resumed_from if checkpoint is not None else 0
+        if hashes is not None:
+            result['skipped'] = hashes.skipped
+        return result
 
-        # REPORT
-        if td.report.exceptions:
+    def write_report(self, result):
+        """
+        Args:
+            result: dict - see `loadjson.workers.get_result`
+        """
+        if result['exceptions']:
             self.stdout.write("EXCEPTIONS")
-        for exc_type, exc_list in iter(td.report.exceptions.items()):
+        for exc_type, exc_list in iter(result['exceptions'].items()):
             self.stdout.write(exc_type + "<" * 30)
             if len(exc_list) > 10:
                 self.stdout.write("    - {} ERRORS".format(len(exc_list)))
@@ -27,6 +215,21 @@ class Command(BaseCommand):
                 for message in exc_list:
                     self.stdout.write("    - {}".format(message))
             self.stdout.write("^" * 40)
+        for field, stats in iter(result['parser_stats'].items()):
+            self.stdout.write("PARSER {} - {}".format(field, ", ".join(
+                "{}: {}".format(key, value) for key, value in sorted(stats.items()))))
         self.stdout.write(" Done!")
-        self.stdout.write("CREATED - {}".format(td.report.created))
-        self.stdout.write("UPDATED - {}".format(td.report.updated))
+        if result.get('resumed_from'):
+            self.stdout.write("RESUMED - after {} items".format(result['resumed_from']))
+        self.stdout.write("CREATED - {}".format(result['created']))
+        self.stdout.write("UPDATED - {}".format(result['updated']))
+        if result.get('skipped') is not None:
+            self.stdout.write("SKIPPED (not changed since the last run) - {}".format(result['skipped']))
+        if result['unchanged']:
+            self.stdout.write("UNCHANGED - {}".format(result['unchanged']))
+        if result['dependencies_loaded'] or result['dependencies_reused']:
+            self.stdout.write("DEPENDENCIES - loaded: {}, reused: {}".format(
+                result['dependencies_loaded'], result['dependencies_reused']))
+        if result['bytes_read'] is not None:
+            self.stdout.write("READ - {} bytes ({} bytes decompressed)".format(
+                result['bytes_read'], result['bytes_decompressed']))
@@ -0,0 +1,202 @@
+import re
+import six
+import datetime
+import dateutil.parser
+from dateutil.tz import tzutc, tzoffset
+from .cache import LRUCache
+from .loaders import RelativeKeyDoesNotExist
+
+ISO_8601_RE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?(Z|[+-]\d{2}(?::?\d{2})?)?)?$'
+)
+
+
+def parse_iso_datetime(value):
+    """
+    Parse strict ISO-8601 date or datetime string, ex. "2016-03-08", "2016-03-08T21:45:00.123+02:00".
+
+    Returns: :datetime or None if the value is not a valid ISO-8601 string
+    """
+    match = ISO_8601_RE.match(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, tz = match.groups()
+    tzinfo = None
+    if tz == 'Z':
+        tzinfo = tzutc()
+    elif tz:
+        offset = int(tz[1:3]) * 3600 + (int(tz[-2:]) * 60 if len(tz) > 3 else 0)
+        if tz[0] == '-':
+            offset = -offset
+        tzinfo = tzutc() if offset == 0 else tzoffset(None, offset)
+    try:
+        return datetime.datetime(int(year), int(month), int(day),
+                                 int(hour or 0), int(minute or 0), int(second or 0),
+                                 int(fraction.ljust(6, '0')) if fraction else 0,
+                                 tzinfo=tzinfo)
+    except ValueError:
+        return None
+
+
+class BaseParser(object):
+    """
+    Parsers convert raw data values to internal (model) values. A parser is created once per field
+    when the manifest is compiled.
+
+    `loader` - TransferData instance that owns the manifest
+    `field` - model field name
+    `options` - parser definition from the manifest, ex. {"type": "boolean", "invert": true}
+
+    Note:
+    - define `parse_many(values)` to convert a list of values at once, it is used by the `bulk` engine
+    - define `prefetch(values)` to load whatever is required to parse a batch of values before it is parsed
+    """
+
+    def __init__(self, loader, field, options):
+        self.loader = loader
+        self.field = field
+        self.options = options
+        self.nullable = loader._field_is_nullable(field)
+
+    def parse(self, value):
+        """
+        Usage: what returned gets saved
+        """
+        raise NotImplementedError
+
+    def __call__(self, value):
+        return self.parse(value)
+
+
+class StringParser(BaseParser):
+
+    def parse(self, value):
+        return str(value)
+
+    def parse_many(self, values):
+        return [str(value) for value in values]
+
+
+class IntegerParser(BaseParser):
+
+    def parse(self, value):
+        return int(value)
+
+    def parse_many(self, values):
+        return [int(value) for value in values]
+
+
+class BooleanParser(BaseParser):
+
+    def __init__(self, *args, **kwargs):
+        super(BooleanParser, self).__init__(*args, **kwargs)
+        self.invert = self.options.get('invert', False)
+
+    def parse(self, value):
+        return not bool(value) if self.invert else bool(value)
+
+    def parse_many(self, values):
+        if self.invert:
+            return [not bool(value) for value in values]
+        return [bool(value) for value in values]
+
+
+class DateTimeParser(BaseParser):
+    """
+    Parse datetime strings. Strict ISO-8601 strings (or strings in `format`, if defined) are parsed
+    without `dateutil`, which is used as a fallback. Parsed values are cached, `cache_size` values at most.
+
+    `stats` - how many values were parsed by the fast path, by `dateutil` or were found in cache
+    """
+    cache_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super(DateTimeParser, self).__init__(*args, **kwargs)
+        self.format = self.options.get('format')
+        self.cache = LRUCache(self.options.get('cache_size', self.cache_size))
+        self.stats = {'fast': 0, 'fallback': 0, 'cached': 0}
+
+    def parse_fast(self, value):
+        if self.format is not None:
+            try:
+                return datetime.datetime.strptime(value, self.format)
+            except ValueError:
+                return None
+        return parse_iso_datetime(value)
+
+    def parse(self, value):
+        if not isinstance(value, six.string_types):
+            self.stats['fallback'] += 1
+            return dateutil.parser.parse(value)
+        dt = self.cache.get(value)
+        if dt is not None:
+            self.stats['cached'] += 1
+            return dt
+        dt = self.parse_fast(value)
+        if dt is not None:
+            self.stats['fast'] += 1
+        else:
+            dt = dateutil.parser.parse(value)
+            self.stats['fallback'] += 1
+        self.cache.set(value, dt)
+        return dt
+
+
+class RelativeKeyParser(BaseParser):
+    """
+    Lookup the relative key by the field value in another dataset.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RelativeKeyParser, self).__init__(*args, **kwargs)
+        self.data_name = self.options.get('data_name')
+        self.rk = self.loader._rk_lookup(self.options)
+        self.lookup = self.options.get('lookup')
+        self.many = self.options.get('many', False)
+        self.dependency = None
+        # objects of the current batch, see `TransferData.prefetch_rk_objs`
+        self.prefetched = None
+
+    def get_dependency(self):
+        """
+        Loader of the dataset the relative keys are looked up in, resolved once per parser.
+        """
+        if self.dependency is None:
+            self.dependency = self.loader.get_dependency(self.data_name, rk=self.rk, lookup=self.lookup)
+        return self.dependency
+
+    def prefetch(self, values):
+        if self.many:
+            values = [val for value in values if isinstance(value, list) for val in value]
+        self.prefetched = self.get_dependency().prefetch_rk_objs(self.rk, values, lookup=self.lookup)
+
+    def parse(self, value):
+        dependency = self.get_dependency()
+        fk_obj = dependency.get_rk_obj(rk=self.rk, value=value, many=self.many, lookup=self.lookup,
+                                       prefetched=self.prefetched)
+        if fk_obj is None and not self.nullable:
+            raise RelativeKeyDoesNotExist("Can't find related object by key: {}".format(value))
+        return fk_obj
+
+
+class RelativeObjectParser(BaseParser):
+    """
+    Get, create or update a related object.
+    """
+
+    def parse(self, value):
+        return self.loader._handle_relative_objects(value,
+                                                    data_name=self.options.get('data_name'),
+                                                    manifest=self.options.get('manifest'),
+                                                    many=self.options.get('many', False))
+
+
+PARSER_CLASSES = {
+    'string': 'loadjson.parsers.StringParser',
+    'integer': 'loadjson.parsers.IntegerParser',
+    'boolean': 'loadjson.parsers.BooleanParser',
+    'datetime': 'loadjson.parsers.DateTimeParser',
+    'relative_key': 'loadjson.parsers.RelativeKeyParser',
+    'relative_object': 'loadjson.parsers.RelativeObjectParser',
+}
@@ -0,0 +1,385 @@
+import os
+import re
+import io
+import bz2
+import gzip
+import json
+from contextlib import contextmanager
+import six
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+NON_WHITESPACE_RE = re.compile(r'\S')
+
+
+class _DecompressedFile(io.RawIOBase):
+    """
+    Readable binary file that decompresses another file object, used where the standard library
+    can't decompress file objects.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, fileobj, decompressor):
+        self.fileobj = fileobj
+        self.decompressor = decompressor
+        self.buffer = b''
+        self.position = 0
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer and not self.eof:
+            chunk = self.fileobj.read(self.chunk_size)
+            if not chunk:
+                self.eof = True
+                break
+            try:
+                self.buffer = self.decompressor.decompress(chunk)
+            except EOFError:
+                # data after the end of the compressed stream
+                self.eof = True
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        self.position += size
+        return size
+
+    def tell(self):
+        return self.position
+
+
+def _open_gzip(fileobj):
+    gzip_file = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if six.PY2:
+        # `GzipFile` of Python 2 has no `read1` required by `TextIOWrapper`
+        return io.BufferedReader(gzip_file)
+    return gzip_file
+
+
+def _open_bz2(fileobj):
+    if six.PY2:
+        # `BZ2File` of Python 2 takes only a file name
+        return io.BufferedReader(_DecompressedFile(fileobj, bz2.BZ2Decompressor()))
+    return bz2.BZ2File(fileobj, mode='rb')
+
+
+# file extension -> function that wraps a binary file object to decompress it
+COMPRESSIONS = {
+    '.gz': _open_gzip,
+    '.bz2': _open_bz2,
+}
+if lzma is not None:
+    COMPRESSIONS['.xz'] = lambda fileobj: lzma.LZMAFile(fileobj, mode='rb')
+
+
+def get_compression(path):
+    """
+    Returns: :str - compressed file extension, ex. ".gz", or None if file is not compressed
+    """
+    for ext in COMPRESSIONS.keys():
+        if path.endswith(ext):
+            return ext
+    return None
+
+
+class LoadedData(list):
+    """
+    Items of a data file loaded into memory.
+
+    `path` - path to the data file
+    `bytes_read`, `bytes_decompressed` - number of bytes read from the file and decompressed, see `DataStream`
+    """
+
+    def __init__(self, items, path=None, bytes_read=None, bytes_decompressed=None):
+        super(LoadedData, self).__init__(items)
+        self.path = path
+        self.bytes_read = bytes_read
+        self.bytes_decompressed = bytes_decompressed
+
+
+class DataStream(object):
+    """
+    Lazy, re-iterable sequence of data items. Every iteration reads the data from the start,
+    so only the items being processed are kept in memory.
+
+    Compressed files (see `COMPRESSIONS`) are decompressed while reading.
+    `bytes_read` and `bytes_decompressed` are the number of bytes read from the file and
+    decompressed by the last iteration (equal for files that are not compressed).
+    `position` - offset right after the last item read, see `from_position`.
+    """
+    path = None
+    bytes_read = 0
+    bytes_decompressed = 0
+    position = 0
+
+    @property
+    def compression(self):
+        return get_compression(self.path)
+
+    @contextmanager
+    def open_binary(self):
+        raw = io.open(self.path, 'rb')
+        try:
+            compression = self.compression
+            fileobj = COMPRESSIONS[compression](raw) if compression is not None else raw
+            try:
+                yield fileobj
+            finally:
+                self.bytes_decompressed = fileobj.tell()
+                self.bytes_read = raw.tell()
+                if fileobj is not raw:
+                    fileobj.close()
+        finally:
+            raw.close()
+
+    def __iter__(self):
+        self.position = 0
+        for item, position in self._iter_with_position():
+            self.position = position
+            yield item
+
+    def from_position(self, position):
+        """
+        Stream of the items after `position` (see `position`) without reading the items before it,
+        or None if the stream can't be read from the middle.
+        """
+        return None
+
+    def _iter_with_position(self):
+        """
+        Yield (item, position) tuples, where position is the offset right after the item.
+        """
+        raise NotImplementedError
+
+    def size(self):
+        """
+        Returns: :int - size of the data in bytes, or None if unknown
+        """
+        return None
+
+    def estimate_count(self, sample_size=100):
+        """
+        Estimate the number of items by the average size of the first `sample_size` items.
+
+        Returns: :int - approximate number of items, or None if unknown
+        """
+        size = self.size()
+        if size is None:
+            return None
+        count = position = 0
+        for _, position in self._iter_with_position():
+            count += 1
+            if count >= sample_size:
+                break
+        if count < sample_size:
+            return count
+        return int(size / (float(position) / count))
+
+
+class _Buffer(object):
+    """
+    Bounded read buffer over a text file, used to decode JSON values one by one.
+    """
+
+    def __init__(self, fileobj, buffer_size):
+        self.fileobj = fileobj
+        self.buffer_size = buffer_size
+        self.buf = ''
+        self.pos = 0
+        # number of characters dropped from the buffer
+        self.offset = 0
+
+    def read(self, size=None):
+        chunk = self.fileobj.read(size or self.buffer_size)
+        if not chunk:
+            return False
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def tell(self):
+        return self.offset + self.pos
+
+    def next_char(self):
+        """
+        Skip whitespace and return the next character ('' at the end of file).
+        """
+        while True:
+            match = NON_WHITESPACE_RE.search(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self.read():
+                return ''
+
+    def decode(self, decoder):
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # incomplete value, read as much as is buffered to avoid re-parsing large values too often
+                if self.read(max(self.buffer_size, len(self.buf) - self.pos)):
+                    continue
+                raise
+            if end == len(self.buf) and self.read():
+                # a number may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+
+class JSONArrayStream(DataStream):
+    """
+    Stream items of a JSON file that contains a top-level array.
+    Note: items are decoded by the standard `json` module, other decoders can't decode incrementally.
+    """
+    buffer_size = 64 * 1024
+
+    def __init__(self, path, buffer_size=None, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        if buffer_size is not None:
+            self.buffer_size = buffer_size
+
+    def _iter_with_position(self):
+        decoder = json.JSONDecoder()
+        with self.open_binary() as binary:
+            fileobj = io.TextIOWrapper(binary, encoding=self.encoding)
+            try:
+                for item in self._iter_array(fileobj, decoder):
+                    yield item
+            finally:
+                # keep the binary file open to collect stats
+                fileobj.detach()
+
+    def _iter_array(self, fileobj, decoder):
+        buf = _Buffer(fileobj, self.buffer_size)
+        if buf.next_char() != '[':
+            raise ValueError("Data must be a list: {}".format(self.path))
+        buf.pos += 1
+        if buf.next_char() == ']':
+            return
+        while True:
+            yield buf.decode(decoder), buf.tell()
+            char = buf.next_char()
+            if char == ',':
+                buf.pos += 1
+                buf.next_char()
+            elif char == ']':
+                return
+            else:
+                raise ValueError("Invalid JSON array: {}".format(self.path))
+
+    def size(self):
+        if self.compression is not None:
+            return None
+        return os.path.getsize(self.path)
+
+
+class JSONLinesStream(DataStream):
+    """
+    Stream items of a newline-delimited JSON file (JSON Lines, NDJSON), one item per line.
+
+    `start`, `stop` - byte offsets to read a part of the file. The stream contains the lines that start
+    within [start, stop), so adjacent parts never share or miss a line.
+    """
+
+    def __init__(self, path, start=0, stop=None, encoding='utf-8', decoder=None):
+        self.path = path
+        self.start = start
+        self.stop = stop
+        self.encoding = encoding
+        self.decoder = decoder
+
+    def size(self):
+        if self.compression is not None:
+            return None
+        stop = self.stop if self.stop is not None else os.path.getsize(self.path)
+        return max(stop - self.start, 0)
+
+    def _iter_with_position(self):
+        loads = self.decoder.loads if self.decoder is not None else lambda line: json.loads(line.decode(self.encoding))
+        with self.open_binary() as fileobj:
+            position = 0
+            if self.start > 0:
+                # skip the line that started before `start`
+                fileobj.seek(self.start - 1)
+                position = self.start - 1 + len(fileobj.readline())
+            for line in iter(fileobj.readline, b''):
+                if self.stop is not None and position >= self.stop:
+                    return
+                position += len(line)
+                line = line.strip()
+                if line:
+                    yield loads(line), position - self.start
+
+    def from_position(self, position):
+        if self.compression is not None:
+            return None
+        return JSONLinesStream(self.path, start=self.start + position, stop=self.stop, encoding=self.encoding,
+                               decoder=self.decoder)
+
+    def split(self, parts):
+        """
+        Split the stream into `parts` streams of about the same size, ex. to read them in parallel.
+        Compressed files can't be split.
+        """
+        size = self.size()
+        if size is None:
+            raise ValueError("Can't split compressed file: {}".format(self.path))
+        bounds = [self.start + size * n // parts for n in range(parts)] + [self.start + size]
+        return [JSONLinesStream(self.path, start=bounds[n], stop=bounds[n + 1], encoding=self.encoding,
+                                decoder=self.decoder)
+                for n in range(parts)]
+
+
+def project(item, paths):
+    """
+    Copy of `item` that contains only the values at `paths` (tuples of keys), missing paths are skipped.
+    """
+    projected = {}
+    for path in paths:
+        value = item
+        for p in path:
+            if not isinstance(value, dict) or p not in value:
+                break
+            value = value[p]
+        else:
+            target = projected
+            for p in path[:-1]:
+                target = target.setdefault(p, {})
+            target[path[-1]] = value
+    return projected
+
+
+class ProjectedStream(DataStream):
+    """
+    Stream that keeps only the values at `paths` of every item of another stream.
+    """
+
+    def __init__(self, stream, paths):
+        self.stream = stream
+        self.paths = paths
+        self.path = stream.path
+
+    @property
+    def bytes_read(self):
+        return self.stream.bytes_read
+
+    @property
+    def bytes_decompressed(self):
+        return self.stream.bytes_decompressed
+
+    def size(self):
+        return self.stream.size()
+
+    def _iter_with_position(self):
+        for item, position in self.stream._iter_with_position():
+            yield project(item, self.paths), position
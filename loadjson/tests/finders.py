@@ -21,9 +21,33 @@ TEST_MANIFEST = {
             "key": "key"
         },
         "lookup": "key"
+    },
+    "tree_data": {
+        "model": "tests.MyTreeModel",
+        "mapping": {
+            "name": "name",
+            "key": "key",
+            "parent": "parent",
+            "links": "links"
+        },
+        "parsers": {
+            "parent": {"type": "relative_key", "data_name": "tree_data", "rk_lookup": "key"},
+            "links": {"type": "relative_key", "data_name": "tree_data", "rk_lookup": "key", "many": True}
+        },
+        "nullable": ["parent"],
+        "lookup": "key",
+        "m2m_fields": ["links"],
+        "deferred_fields": ["parent", "links"]
     }
 }
 
+# Items refer to the items that follow them
+TEST_DATA['tree_data'] = [
+    {"name": "Leaf", "key": 2, "parent": 1, "links": [0, 1]},
+    {"name": "Branch", "key": 1, "parent": 0, "links": [2]},
+    {"name": "Root", "key": 0, "parent": None, "links": []}
+]
+
 # Fill related model data for tests
 TEST_DATA['related_data'] = []
 for n in range(5):
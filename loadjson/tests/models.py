@@ -21,3 +21,11 @@ class MyModel(models.Model):
     date_field = models.DateField(default=timezone.now)
     related_obj = models.ForeignKey(MyRelatedModel, null=True, related_name='+')
     many_related_objs = models.ManyToManyField(MyRelatedModel)
+
+
+class MyTreeModel(models.Model):
+
+    name = models.CharField(max_length=255)
+    key = models.IntegerField(unique=True)
+    parent = models.ForeignKey('self', null=True, related_name='children')
+    links = models.ManyToManyField('self', symmetrical=False)
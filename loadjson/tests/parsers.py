@@ -0,0 +1,16 @@
+from __future__ import unicode_literals
+from loadjson.parsers import BaseParser
+
+
+class UpperCaseParser(BaseParser):
+    """
+    Parser for tests.
+    """
+    parse_many_calls = 0
+
+    def parse(self, value):
+        return value.upper()
+
+    def parse_many(self, values):
+        UpperCaseParser.parse_many_calls += 1
+        return [value.upper() for value in values]
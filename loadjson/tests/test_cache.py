@@ -0,0 +1,38 @@
+from __future__ import unicode_literals
+from django.test import SimpleTestCase
+from loadjson.cache import LRUCache, FIFOCache, make_cache
+
+
+class CacheTest(SimpleTestCase):
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        # 'b' is the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_fifo_cache(self):
+        cache = FIFOCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        # 'a' is the oldest
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_unbounded_cache(self):
+        cache = make_cache('lru', None)
+        for n in range(1000):
+            cache.set(n, n)
+        self.assertEqual(len(cache), 1000)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            make_cache('foo')
@@ -0,0 +1,45 @@
+from __future__ import unicode_literals
+import sys
+import json
+import timeit
+from django.test import SimpleTestCase
+from loadjson.decoders import get_decoder, available_decoders, StdlibDecoder
+
+
+class DecodersTest(SimpleTestCase):
+
+    def test_get_decoder(self):
+        self.assertIsInstance(get_decoder('json'), StdlibDecoder)
+        self.assertIsInstance(get_decoder('loadjson.decoders.StdlibDecoder'), StdlibDecoder)
+        # auto always finds at least the standard library decoder
+        self.assertIsNotNone(get_decoder())
+        self.assertIsNotNone(get_decoder('auto'))
+        with self.assertRaises(ValueError) as cm:
+            get_decoder('simplejson')
+        self.assertIn("'simplejson' decoder is not supported", str(cm.exception))
+
+    def test_decode_bytes_and_text(self):
+        document = '[{"name": "caf\\u00e9", "key": 1, "value": 1.5, "flag": true, "empty": null}]'
+        expected = json.loads(document)
+        for name, decoder in available_decoders():
+            self.assertEqual(decoder.loads(document), expected, name)
+            self.assertEqual(decoder.loads(document.encode('utf-8')), expected, name)
+
+    def test_decode_benchmark(self):
+        """
+        Micro-benchmark: decode a generated list of items with every installed decoder.
+        """
+        data = [{"username": "user{}".format(n),
+                 "email": "user{}@example.com".format(n),
+                 "active": n % 2 == 0,
+                 "number": n,
+                 "preferences": {"email_notifications": True, "number_of_friends": str(n % 50)},
+                 "friends": ["user{}@example.com".format(n + f) for f in range(5)]}
+                for n in range(5000)]
+        document = json.dumps(data).encode('utf-8')
+        results = []
+        for name, decoder in available_decoders():
+            self.assertEqual(decoder.loads(document), data, name)
+            results.append((name, min(timeit.repeat(lambda: decoder.loads(document), number=1, repeat=3))))
+        sys.stderr.write("\nDecode {} bytes: {}\n".format(
+            len(document), ", ".join("{} {:.4f}s".format(name, seconds) for name, seconds in results)))
@@ -0,0 +1,166 @@
+from __future__ import unicode_literals
+import os
+import bz2
+import io
+import gzip
+import json
+import shutil
+import tempfile
+from io import open
+from django.conf import settings
+from django.test import TestCase
+from loadjson.finders import DefaultDataFinder
+from loadjson.loaders import TransferData
+from loadjson.streams import JSONArrayStream, JSONLinesStream, _DecompressedFile
+from loadjson.tests.models import MyRelatedModel
+
+
+class FindersTest(TestCase):
+
+    data = [{"name": "Name {}".format(n), "key": n, "nested": {"text": "\"quoted\", [escaped] é"}}
+            for n in range(50)]
+    manifest = {"model": "tests.MyRelatedModel",
+                "mapping": {"name": "name",
+                            "key": "key"},
+                "lookup": "key"}
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.write('stream_data.json', self.data)
+        self.write('stream_data.manifest.json', self.manifest)
+        self.settings_override = self.settings(LOAD_JSON=dict(settings.LOAD_JSON, DATA_DIRS=[self.data_dir]))
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.data_dir)
+
+    def write_lines(self, file_name, items):
+        with open(os.path.join(self.data_dir, file_name), 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    def write(self, file_name, content, indent=None):
+        with open(os.path.join(self.data_dir, file_name), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(content, indent=indent, ensure_ascii=False))
+
+    def test_json_array_stream(self):
+        self.write('indented.json', self.data, indent=4)
+        for file_name in ('stream_data.json', 'indented.json'):
+            for buffer_size in (1, 7, 1024):
+                stream = JSONArrayStream(os.path.join(self.data_dir, file_name), buffer_size=buffer_size)
+                self.assertEqual(list(stream), self.data)
+                # streams can be iterated more than once
+                self.assertEqual(list(stream), self.data)
+
+    def test_json_array_stream_numbers(self):
+        data = [12345678, 1.5e10, -3, True, None, "a"]
+        self.write('numbers.json', data)
+        stream = JSONArrayStream(os.path.join(self.data_dir, 'numbers.json'), buffer_size=3)
+        self.assertEqual(list(stream), data)
+
+    def test_json_array_stream_empty(self):
+        self.write('empty.json', [])
+        self.assertEqual(list(JSONArrayStream(os.path.join(self.data_dir, 'empty.json'))), [])
+
+    def test_json_array_stream_not_list(self):
+        self.write('object.json', {"foo": "bar"})
+        with self.assertRaises(ValueError):
+            list(JSONArrayStream(os.path.join(self.data_dir, 'object.json')))
+
+    def test_json_array_stream_estimate_count(self):
+        data = [{"key": n} for n in range(1000, 2000)]
+        self.write('count.json', data)
+        stream = JSONArrayStream(os.path.join(self.data_dir, 'count.json'))
+        self.assertAlmostEqual(stream.estimate_count(), len(data), delta=len(data) * 0.1)
+
+    def test_default_finder_stream(self):
+        finder = DefaultDataFinder([self.data_dir], stream=True)
+        stream = finder.find('stream_data')
+        self.assertIsInstance(stream, JSONArrayStream)
+        self.assertEqual(list(stream), self.data)
+        self.assertEqual(finder.find_manifest('stream_data'), self.manifest)
+
+    def test_stream_import(self):
+        td = TransferData(data_name='stream_data', stream=True)
+        self.assertTrue(td.report.count_estimated)
+        self.assertIsNone(td.import_data(keep_objects=False))
+        self.assertEqual(td.report.created, len(self.data))
+        self.assertEqual(MyRelatedModel.objects.count(), len(self.data))
+
+    def test_json_lines_stream(self):
+        self.write_lines('lines.jsonl', self.data)
+        stream = JSONLinesStream(os.path.join(self.data_dir, 'lines.jsonl'))
+        self.assertEqual(list(stream), self.data)
+        self.assertEqual(stream.estimate_count(), len(self.data))
+
+    def test_json_lines_split(self):
+        self.write_lines('lines.jsonl', self.data)
+        stream = JSONLinesStream(os.path.join(self.data_dir, 'lines.jsonl'))
+        for parts in (1, 2, 3, 7, 200):
+            items = []
+            for part in stream.split(parts):
+                items.extend(part)
+            self.assertEqual(items, self.data)
+
+    def test_default_finder_json_lines(self):
+        self.write_lines('lines_data.ndjson', self.data)
+        self.write('lines_data.manifest.json', self.manifest)
+        finder = DefaultDataFinder([self.data_dir])
+        self.assertEqual(finder.find('lines_data'), self.data)
+        self.assertEqual(finder.find('lines_data.ndjson'), self.data)
+        self.assertEqual(finder.find_manifest('lines_data.ndjson'), self.manifest)
+        self.assertIsInstance(DefaultDataFinder([self.data_dir], stream=True).find('lines_data'), JSONLinesStream)
+
+    def test_json_lines_import(self):
+        self.write_lines('lines_data.jsonl', self.data)
+        self.write('lines_data.manifest.json', self.manifest)
+        td = TransferData(data_name='lines_data.jsonl', stream=True)
+        td.import_data()
+        self.assertEqual(MyRelatedModel.objects.count(), len(self.data))
+
+    def write_compressed(self, file_name, content):
+        open_compressed = gzip.open if file_name.endswith('.gz') else bz2.BZ2File
+        with open_compressed(os.path.join(self.data_dir, file_name), 'wb') as f:
+            f.write(content.encode('utf-8'))
+
+    def test_compressed_stream(self):
+        content = json.dumps(self.data)
+        lines = "".join(json.dumps(item) + "\n" for item in self.data)
+        self.write_compressed('data.json.gz', content)
+        self.write_compressed('data.jsonl.bz2', lines)
+        array_stream = JSONArrayStream(os.path.join(self.data_dir, 'data.json.gz'))
+        lines_stream = JSONLinesStream(os.path.join(self.data_dir, 'data.jsonl.bz2'))
+        for stream, decompressed in ((array_stream, content), (lines_stream, lines)):
+            self.assertEqual(list(stream), self.data)
+            self.assertEqual(stream.bytes_decompressed, len(decompressed.encode('utf-8')))
+            self.assertLess(stream.bytes_read, stream.bytes_decompressed)
+            self.assertIsNone(stream.estimate_count())
+
+    def test_default_finder_compressed(self):
+        self.write_compressed('compressed_data.json.gz', json.dumps(self.data))
+        self.write('compressed_data.manifest.json', self.manifest)
+        finder = DefaultDataFinder([self.data_dir])
+        self.assertEqual(finder.find('compressed_data'), self.data)
+        self.assertEqual(finder.find('compressed_data.json.gz'), self.data)
+        self.assertEqual(finder.find_manifest('compressed_data.json.gz'), self.manifest)
+
+    def test_compressed_import(self):
+        self.write_compressed('compressed_data.jsonl.gz', "".join(json.dumps(item) + "\n" for item in self.data))
+        self.write('compressed_data.manifest.json', self.manifest)
+        td = TransferData(data_name='compressed_data', stream=True)
+        self.assertIsNone(td.report.count)
+        td.import_data()
+        self.assertEqual(MyRelatedModel.objects.count(), len(self.data))
+        self.assertLess(td.report.bytes_read, td.report.bytes_decompressed)
+        # data loaded into memory reports the bytes as well
+        td = TransferData(data_name='compressed_data')
+        td.import_data()
+        self.assertLess(td.report.bytes_read, td.report.bytes_decompressed)
+
+    def test_decompressed_file(self):
+        lines = "".join(json.dumps(item) + "\n" for item in self.data)
+        self.write_compressed('data.jsonl.bz2', lines)
+        with io.open(os.path.join(self.data_dir, 'data.jsonl.bz2'), 'rb') as raw:
+            fileobj = io.BufferedReader(_DecompressedFile(raw, bz2.BZ2Decompressor()))
+            self.assertEqual(io.TextIOWrapper(fileobj, encoding='utf-8').read(), lines)
@@ -0,0 +1,85 @@
+from __future__ import unicode_literals
+import os
+import sys
+import shutil
+import tempfile
+import six
+from django.core.management import call_command
+from django.test import TestCase
+from loadjson.finders import DefaultDataFinder
+from loadjson.graph import DependencyCycle, build_graph, find_cycle, find_data_names, get_released, topological_levels
+from loadjson.loaders import LoaderContext, TransferData
+from loadjson.tests.finders import TEST_MANIFEST
+from loadjson.tests.models import MyRelatedModel, MyTreeModel
+
+
+class GraphTest(TestCase):
+
+    def setUp(self):
+        TEST_MANIFEST['graph_items'] = {
+            "model": "tests.MyModel",
+            "mapping": {"related_obj": "related", "many_related_objs": "objects"},
+            "parsers": {"related_obj": {"type": "relative_key", "data_name": "related_data", "rk_lookup": "key"},
+                        "many_related_objs": {"type": "relative_object",
+                                              "manifest": {"model": "tests.MyRelatedModel",
+                                                           "mapping": {"key": "key"},
+                                                           "parsers": {"key": {"type": "relative_key",
+                                                                               "data_name": "graph_keys"}}},
+                                              "many": True}}}
+        TEST_MANIFEST['graph_keys'] = {"model": "tests.MyRelatedModel", "mapping": {}}
+
+    def tearDown(self):
+        del TEST_MANIFEST['graph_items']
+        del TEST_MANIFEST['graph_keys']
+
+    def test_build_graph(self):
+        graph = build_graph(['graph_items', 'graph_keys', 'related_data'], LoaderContext())
+        self.assertEqual(graph, {'graph_items': {'related_data', 'graph_keys'},
+                                 'graph_keys': set(),
+                                 'related_data': set()})
+        self.assertEqual(topological_levels(graph), [['graph_keys', 'related_data'], ['graph_items']])
+        # datasets that are not imported are left out
+        self.assertEqual(build_graph(['graph_items'], LoaderContext()), {'graph_items': set()})
+
+    def test_release(self):
+        context = LoaderContext()
+        order = ['graph_keys', 'related_data', 'graph_items', 'tree_data']
+        self.assertEqual(get_released(order, context), [set(), set(), {'graph_keys', 'graph_items', 'related_data'},
+                                                        {'tree_data'}])
+        loader = TransferData(data_name='related_data', context=context)
+        context.get_loader(manifest=TEST_MANIFEST['graph_items'])
+        self.assertIn('related_data', context.dependencies)
+        context.release({'related_data'})
+        self.assertNotIn('related_data', context.dependencies)
+        self.assertEqual(context.loaders, {})
+        # loaded again if required
+        self.assertIsNot(context.dependencies.get('related_data'), loader)
+
+    def test_import_in_order(self):
+        stdout = sys.stdout
+        try:
+            # the progress is written to sys.stdout
+            sys.stdout = six.StringIO()
+            out = six.StringIO()
+            call_command('loadjson', 'tree_data', 'related_data', stdout=out)
+        finally:
+            sys.stdout = stdout
+        self.assertIn("IMPORT related_data", out.getvalue())
+        self.assertEqual(MyRelatedModel.objects.count(), 5)
+        self.assertEqual(MyTreeModel.objects.filter(parent__isnull=False).count(), 2)
+
+    def test_cycle(self):
+        graph = {'a': {'b'}, 'b': {'c'}, 'c': {'a'}, 'd': set()}
+        self.assertEqual(find_cycle(graph), ['a', 'b', 'c', 'a'])
+        with self.assertRaises(DependencyCycle):
+            topological_levels(graph)
+        self.assertIsNone(find_cycle({'a': {'b'}, 'b': set(), 'c': {'a', 'b'}}))
+
+    def test_find_data_names(self):
+        data_dir = tempfile.mkdtemp()
+        try:
+            for file_name in ('users.json', 'users.manifest.json', 'groups.jsonl.gz', 'notes.txt'):
+                open(os.path.join(data_dir, file_name), 'w').close()
+            self.assertEqual(find_data_names(data_dir, DefaultDataFinder([data_dir])), ['groups', 'users'])
+        finally:
+            shutil.rmtree(data_dir)
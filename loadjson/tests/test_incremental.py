@@ -0,0 +1,183 @@
+from __future__ import unicode_literals
+import os
+import sys
+import six
+import json
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.test import TestCase
+from loadjson.incremental import ContentHashes, Checkpoint
+from loadjson.loaders import TransferData, InvalidManifest
+from loadjson.streams import JSONLinesStream
+from loadjson.tests.models import MyRelatedModel
+
+
+class ContentHashesTest(TestCase):
+
+    manifest = {"model": "tests.MyRelatedModel",
+                "mapping": {"name": "name",
+                            "key": "id.key"},
+                "lookup": "key"}
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.state_dir, 'state')
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def run_import(self, data, manifest=None, success=True):
+        td = TransferData(data=data, manifest=manifest or self.manifest)
+        hashes = ContentHashes(self.state_file, td, data_name='related')
+        td.import_data(item_filter=hashes.filter)
+        if success:
+            hashes.commit()
+        else:
+            hashes.rollback()
+        hashes.close()
+        return td, hashes
+
+    def test_incremental(self):
+        data = [{"name": "Name {}".format(n), "id": {"key": n}} for n in range(5)]
+        td, hashes = self.run_import(data)
+        self.assertEqual((td.report.created, hashes.skipped), (5, 0))
+
+        data[1] = {"name": "Changed", "id": {"key": 1}}
+        data.append({"name": "New", "id": {"key": 5}})
+        td, hashes = self.run_import(data)
+        self.assertEqual((td.report.created, td.report.updated, hashes.skipped), (1, 1, 4))
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "Changed")
+
+        td, hashes = self.run_import(data)
+        self.assertEqual((td.report.item, hashes.skipped), (0, 6))
+
+        # a changed manifest imports everything again
+        td, hashes = self.run_import(data, manifest=dict(self.manifest, nullable=[]))
+        self.assertEqual((td.report.item, hashes.skipped), (6, 0))
+
+    def test_failed_run_is_not_saved(self):
+        data = [{"name": "Name {}".format(n), "id": {"key": n}} for n in range(3)]
+        self.run_import(data, success=False)
+        td, hashes = self.run_import(data)
+        self.assertEqual((td.report.item, hashes.skipped), (3, 0))
+
+    def test_lookup_required(self):
+        td = TransferData(data=[], manifest={"model": "tests.MyRelatedModel", "mapping": {"name": "name"}})
+        with self.assertRaises(InvalidManifest):
+            ContentHashes(self.state_file, td)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedCheckpoint(Checkpoint):
+    """
+    Checkpoint that interrupts the import once `saves` checkpoints are saved.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.saves = kwargs.pop('saves')
+        super(InterruptedCheckpoint, self).__init__(*args, **kwargs)
+
+    def save(self, loader):
+        super(InterruptedCheckpoint, self).save(loader)
+        self.saves -= 1
+        if self.saves == 0:
+            raise Interrupted()
+
+
+class CheckpointTest(TestCase):
+
+    data = [{"name": "Name {}".format(n), "key": n} for n in range(9)]
+    manifest = {"model": "tests.MyRelatedModel",
+                "mapping": {"name": "name",
+                            "key": "key"},
+                "lookup": "key",
+                "batch_size": 2}
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.state_dir, 'state')
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def assert_resumed(self, make_data, engine, saves, imported=4):
+        manifest = dict(self.manifest, engine=engine)
+        checkpoint = InterruptedCheckpoint(self.state_file, 'related', resume=False, saves=saves)
+        with self.assertRaises(Interrupted):
+            TransferData(data=make_data(), manifest=manifest).import_data(checkpoint=checkpoint)
+        checkpoint.close()
+        self.assertEqual(MyRelatedModel.objects.count(), imported)
+
+        checkpoint = Checkpoint(self.state_file, 'related')
+        td = TransferData(data=make_data(), manifest=manifest)
+        td.import_data(checkpoint=checkpoint)
+        self.assertEqual(checkpoint.resumed_from, imported)
+        self.assertEqual((td.report.item, td.report.created, td.report.updated), (9, 9, 0))
+        self.assertEqual(sorted(MyRelatedModel.objects.values_list('key', flat=True)), list(range(9)))
+        checkpoint.clear()
+        checkpoint.close()
+        resumed = checkpoint
+
+        # nothing to resume
+        checkpoint = Checkpoint(self.state_file, 'related')
+        td = TransferData(data=make_data(), manifest=manifest)
+        td.import_data(checkpoint=checkpoint)
+        self.assertEqual((checkpoint.resumed_from, td.report.updated), (0, 9))
+        checkpoint.close()
+        MyRelatedModel.objects.all().delete()
+        return resumed
+
+    def test_resume(self):
+        # the progress is saved every batch of 2 items
+        for engine in ('default', 'bulk'):
+            self.assert_resumed(lambda: list(self.data), engine, saves=2)
+
+    def test_saves(self):
+        # once per batch if the items are committed one by one, once per transaction otherwise
+        for options, saves in (({}, 5), ({"transaction_batch_size": 4}, 3)):
+            checkpoint = InterruptedCheckpoint(self.state_file, 'related', resume=False, saves=0)
+            TransferData(data=list(self.data), manifest=dict(self.manifest, **options)).import_data(
+                checkpoint=checkpoint)
+            self.assertEqual(-checkpoint.saves, saves)
+            checkpoint.clear()
+            checkpoint.close()
+
+    def test_resume_stream(self):
+        path = os.path.join(self.state_dir, 'related.jsonl')
+        with open(path, 'w') as f:
+            f.write(''.join(json.dumps(item) + '\n' for item in self.data))
+        resumed = self.assert_resumed(lambda: JSONLinesStream(path), 'default', saves=2)
+        # the resumed import reads the file from the saved position
+        self.assertEqual(resumed.stream.start, len(''.join(json.dumps(item) + '\n' for item in self.data[:4])))
+
+    def test_changed_data_starts_over(self):
+        checkpoint = InterruptedCheckpoint(self.state_file, 'related', resume=False, saves=1)
+        with self.assertRaises(Interrupted):
+            TransferData(data=list(self.data), manifest=self.manifest).import_data(checkpoint=checkpoint)
+        checkpoint = Checkpoint(self.state_file, 'related')
+        td = TransferData(data=self.data[:5], manifest=self.manifest)
+        td.import_data(checkpoint=checkpoint)
+        self.assertEqual((checkpoint.resumed_from, td.report.item), (0, 5))
+
+
+class StateFileTest(TestCase):
+
+    def test_state_file_used_only_if_asked_for(self):
+        cwd, stdout = os.getcwd(), sys.stdout
+        state_dir = tempfile.mkdtemp()
+        try:
+            os.chdir(state_dir)
+            # the progress is written to sys.stdout
+            sys.stdout = six.StringIO()
+            call_command('loadjson', 'related_data')
+            self.assertFalse(os.path.exists('.loadjson.state'))
+            call_command('loadjson', 'related_data', resume=True)
+            self.assertTrue(os.path.exists('.loadjson.state'))
+        finally:
+            sys.stdout = stdout
+            os.chdir(cwd)
+            shutil.rmtree(state_dir)
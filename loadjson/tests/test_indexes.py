@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+import os
+import json
+import shutil
+import tempfile
+from io import open
+from django.conf import settings
+from django.test import TestCase
+from loadjson.indexes import RKIndex
+from loadjson.loaders import TransferData, LoaderContext
+from loadjson.streams import JSONLinesStream, ProjectedStream
+from loadjson.tests.models import MyRelatedModel
+
+
+class RKIndexTest(TestCase):
+
+    data = [{"name": "Name {}".format(n), "key": n, "nested": {"code": "c{}".format(n % 3)}} for n in range(20)]
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'indexed.jsonl')
+        self.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def write(self, items):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    def test_index(self):
+        index = RKIndex(JSONLinesStream(self.path), 'nested.code')
+        self.assertEqual(index.get('c1'), [item for item in self.data if item['nested']['code'] == 'c1'])
+        self.assertIsNone(index.get('missing'))
+        self.assertTrue(index.built)
+        self.assertTrue(os.path.isfile(self.path + '.rkindex'))
+        index.close()
+
+        # reused by the next run
+        index = RKIndex(JSONLinesStream(self.path), 'nested.code')
+        self.assertEqual(len(index.get('c0')), 7)
+        self.assertFalse(index.built)
+        index.close()
+
+        # rebuilt once the file is modified
+        self.write(self.data[:3])
+        index = RKIndex(JSONLinesStream(self.path), 'nested.code')
+        self.assertEqual(len(index.get('c0')), 1)
+        self.assertTrue(index.built)
+        index.close()
+
+    def test_index_shared(self):
+        with RKIndex(JSONLinesStream(self.path), 'key') as index:
+            self.assertEqual(index.get(1), [self.data[1]])
+            self.assertTrue(index.built)
+            # another process opening the index waits for the build and reuses the index
+            with RKIndex(JSONLinesStream(self.path), 'key') as other:
+                self.assertEqual(other.get(2), [self.data[2]])
+                self.assertFalse(other.built)
+        self.assertIsNone(index.connection)
+        self.assertIsNone(other.connection)
+
+    def test_index_projection_and_dir(self):
+        index_dir = os.path.join(self.data_dir, 'indices')
+        os.mkdir(index_dir)
+        stream = ProjectedStream(JSONLinesStream(self.path), set([('key',)]))
+        index = RKIndex(stream, 'key', index_dir=index_dir)
+        self.assertEqual(index.get(5), [{"key": 5}])
+        self.assertEqual(os.path.dirname(index.db_path), index_dir)
+        index.close()
+        # the full items are indexed separately
+        index = RKIndex(JSONLinesStream(self.path), 'key', index_dir=index_dir)
+        self.assertEqual(index.get(5), [self.data[5]])
+        self.assertTrue(index.built)
+        index.close()
+
+    def test_loader_uses_index(self):
+        manifest = {"model": "tests.MyRelatedModel", "mapping": {"name": "name", "key": "key"}, "lookup": "key"}
+        with open(os.path.join(self.data_dir, 'indexed.manifest.json'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(manifest))
+        load_json = dict(settings.LOAD_JSON, DATA_DIRS=[self.data_dir], FINDER_CLASSES=[], STREAM=True,
+                         RK_INDEX=True)
+        with self.settings(LOAD_JSON=load_json):
+            TransferData(data_name='indexed', context=LoaderContext()).import_data()
+            data = [{"name": "foo", "related": 3}]
+            manifest = {"model": "tests.MyModel",
+                        "mapping": {"char_field": "name", "related_obj": "related"},
+                        "parsers": {"related_obj": {"type": "relative_key", "data_name": "indexed",
+                                                    "rk_lookup": "key"}}}
+            objs = TransferData(data=data, manifest=manifest).import_data()
+        self.assertEqual(objs[0].related_obj, MyRelatedModel.objects.get(key=3))
+        self.assertTrue(os.path.isfile(self.path + '.rkindex'))
@@ -1,8 +1,59 @@
 from __future__ import unicode_literals
 import dateutil.parser
+from django.db import connection
 from django.test import TestCase
-from loadjson.loaders import TransferData, LoadNotConfigured
-from loadjson.tests.models import MyModel
+from django.test.utils import CaptureQueriesContext
+from loadjson.adaptors import BaseAdaptor, ModelHandler
+from loadjson.loaders import TransferData, LoaderContext, LoadNotConfigured, InvalidManifest
+from loadjson.tests.models import MyModel, MyRelatedModel, MyTreeModel
+
+
+class LegacyModelHandler(object):
+    """
+    Custom model handler that defines only the originally documented methods.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, model, lookup_kwargs):
+        self.calls.append('get')
+        return model.objects.get(**lookup_kwargs)
+
+    def create(self, model, data):
+        return model.objects.create(**data)
+
+    def get_or_create(self, model, data, lookup_kwargs):
+        return model.objects.get_or_create(defaults=data, **lookup_kwargs)
+
+    def update_or_create(self, model, data, lookup_kwargs):
+        self.calls.append('update_or_create')
+        return model.objects.update_or_create(defaults=data, **lookup_kwargs)
+
+
+class RecordingModelHandler(ModelHandler):
+    """
+    Model handler that records the calls of the overridden methods.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, model, lookup_kwargs):
+        self.calls.append('get')
+        return super(RecordingModelHandler, self).get(model, lookup_kwargs)
+
+    def create(self, model, data):
+        self.calls.append('create')
+        return super(RecordingModelHandler, self).create(model, data)
+
+    def get_or_create(self, model, data, lookup_kwargs):
+        self.calls.append('get_or_create')
+        return super(RecordingModelHandler, self).get_or_create(model, data, lookup_kwargs)
+
+    def update_or_create(self, model, data, lookup_kwargs):
+        self.calls.append('update_or_create')
+        return super(RecordingModelHandler, self).update_or_create(model, data, lookup_kwargs)
 
 
 class LoadersTest(TestCase):
@@ -80,3 +131,472 @@ class LoadersTest(TestCase):
         self.assertEqual(imported_objects[0].text_field, data['object']['description']['content'])
         self.assertEqual(imported_objects[0].bool_field, data['object']['other']['some_field']['is_truthy'])
         self.assertEqual(imported_objects[0].int_field, data['object']['other']['some_field']['number'])
+
+    def test_compiled_manifest(self):
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "object.name",
+                                "int_field": "number"},
+                    "parsers": {"int_field": {"type": "integer"}},
+                    "nullable": ["char_field"],
+                    "m2m_fields": ["many_related_objs"]}
+        td = TransferData(data=[], manifest=manifest)
+        fields = dict((field_plan.field, field_plan) for field_plan in td.plan.fields)
+        self.assertEqual(fields['char_field'].path, ('object', 'name'))
+        self.assertTrue(fields['char_field'].nullable)
+        self.assertIsNone(fields['char_field'].parser)
+        self.assertFalse(fields['int_field'].nullable)
+        self.assertEqual(fields['int_field'].parser('12'), 12)
+        self.assertEqual(td.plan.m2m_fields, frozenset(["many_related_objs"]))
+
+    def test_transaction_batch_size(self):
+        data = [{"name": "Name {}".format(n)} for n in range(5)]
+        data[2]['name'] = None
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name"},
+                    "nullable": ["char_field"],
+                    "transaction_batch_size": 2,
+                    "skip_integrity_errors": True}
+        td = TransferData(data=data, manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            td.import_data()
+        self.assertEqual(MyModel.objects.count(), 4)
+        self.assertEqual(len(td.report.exceptions['IntegrityError']), 1)
+        # a transaction per 2 items and a savepoint per item
+        savepoints = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SAVEPOINT')]
+        self.assertEqual(len(savepoints), 3 + 5)
+
+    def test_relative_object_integrity_error_savepoint(self):
+        MyTreeModel.objects.create(name="Existing", key=9)
+        manifest = {"model": "tests.MyTreeModel",
+                    "mapping": {"name": "name",
+                                "key": "key",
+                                "parent": "parent"},
+                    "parsers": {"parent": {"type": "relative_object",
+                                           "manifest": {"model": "tests.MyTreeModel",
+                                                        "mapping": {"name": "name", "key": "key"},
+                                                        "skip_integrity_errors": True}}},
+                    "nullable": ["parent"],
+                    "transaction_batch_size": 10}
+        td = TransferData(data=[{"name": "A", "key": 1, "parent": {"name": "P", "key": 9}}], manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            td.import_data()
+        self.assertIsNone(MyTreeModel.objects.get(key=1).parent)
+        # the failing relative object is rolled back to its own savepoint, so the transaction can be used further
+        sqls = [q['sql'] for q in queries.captured_queries]
+        failed = [index for index, sql in enumerate(sqls) if sql.startswith('INSERT') and "'P'" in sql][0]
+        self.assertTrue(sqls[failed - 1].startswith('SAVEPOINT'))
+        self.assertTrue(sqls[failed + 1].startswith('ROLLBACK TO SAVEPOINT'))
+
+    def test_skip_unchanged(self):
+        MyModel.objects.create(char_field="foo", int_field=1, text_field="Old")
+        MyModel.objects.create(char_field="bar", int_field=2, text_field="Same")
+        data = [{"name": "foo", "number": "1", "text": "New"},
+                {"name": "bar", "number": "2", "text": "Same"},
+                {"name": "baz", "number": "3", "text": "Text"}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "int_field": "number",
+                                "text_field": "text"},
+                    "lookup": "char_field",
+                    "skip_unchanged": True}
+        for engine in ('default', 'bulk'):
+            td = TransferData(data=data, manifest=dict(manifest, engine=engine))
+            with CaptureQueriesContext(connection) as queries:
+                td.import_data()
+            updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+            if engine == 'default':
+                self.assertEqual((td.report.created, td.report.updated, td.report.unchanged), (1, 1, 1))
+                # only the changed field of the changed row is saved
+                self.assertEqual(len(updates), 1)
+                self.assertIn('"text_field"', updates[0])
+                self.assertNotIn('"int_field"', updates[0])
+            else:
+                self.assertEqual((td.report.created, td.report.updated, td.report.unchanged), (0, 0, 3))
+                self.assertEqual(updates, [])
+        self.assertEqual(MyModel.objects.get(char_field="foo").text_field, "New")
+        self.assertEqual(MyModel.objects.count(), 3)
+
+    def test_default_engine_preloads_batch(self):
+        for n in range(4):
+            MyRelatedModel.objects.create(name="Old", key=n)
+        manifest = {"model": "tests.MyRelatedModel",
+                    "mapping": {"name": "name",
+                                "key": "key"},
+                    "lookup": "key"}
+        data = [{"name": "New", "key": n} for n in range(6)] + [{"name": "Again", "key": 5}]
+        td = TransferData(data=data, manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            td.import_data()
+        selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        # one query for the existing objects of the batch
+        self.assertEqual(len(selects), 1)
+        self.assertEqual((td.report.created, td.report.updated), (2, 5))
+        self.assertEqual(MyRelatedModel.objects.count(), 6)
+        self.assertEqual(MyRelatedModel.objects.get(key=5).name, "Again")
+
+    def test_default_engine_custom_handler(self):
+        MyRelatedModel.objects.create(name="Old", key=1)
+        manifest = {"model": "tests.MyRelatedModel",
+                    "mapping": {"name": "name",
+                                "key": "key"},
+                    "lookup": "key"}
+        data = [{"name": "New", "key": 1}, {"name": "Other", "key": 2}]
+        for update, calls in ((True, ['update_or_create', 'update_or_create']),
+                              (False, ['get_or_create', 'get_or_create'])):
+            context = LoaderContext()
+            context.model_handler = RecordingModelHandler()
+            td = TransferData(data=data, manifest=dict(manifest, update=update), context=context)
+            td.import_data()
+            # objects are not preloaded, the methods of the handler are called for every item
+            self.assertEqual(context.model_handler.calls, calls)
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "New")
+
+    def test_skip_unchanged_custom_handler(self):
+        MyRelatedModel.objects.create(name="Old", key=1)
+        context = LoaderContext()
+        context.model_handler = LegacyModelHandler()
+        manifest = {"model": "tests.MyRelatedModel",
+                    "mapping": {"name": "name",
+                                "key": "key"},
+                    "lookup": "key",
+                    "skip_unchanged": True}
+        td = TransferData(data=[{"name": "New", "key": 1}], manifest=manifest, context=context)
+        td.import_data()
+        self.assertEqual(td.report.updated, 1)
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "New")
+        # the changed object is saved by the handler, it does not define `update`
+        self.assertEqual(context.model_handler.calls, ['get', 'update_or_create'])
+
+    def test_deferred_fields(self):
+        for engine in ('default', 'bulk'):
+            td = TransferData(data_name='tree_data')
+            td.manifest = dict(td.manifest, engine=engine)
+            td.import_data()
+            self.assertEqual(td.report.created if engine == 'default' else td.report.updated, 3)
+            leaf, branch, root = [MyTreeModel.objects.get(key=key) for key in (2, 1, 0)]
+            self.assertEqual((leaf.parent, branch.parent, root.parent), (branch, root, None))
+            self.assertEqual(set(leaf.links.all()), set([root, branch]))
+            self.assertEqual(list(branch.links.all()), [leaf])
+
+        td = TransferData(data_name='tree_data')
+        td.manifest = dict(td.manifest, deferred_fields=["key"])
+        with self.assertRaises(InvalidManifest):
+            td.import_data()
+
+    def test_transaction_batch_size_invalid(self):
+        manifest = {"model": "tests.MyModel", "mapping": {}, "transaction_batch_size": 0}
+        with self.assertRaises(InvalidManifest):
+            TransferData(data=[], manifest=manifest).import_data()
+
+    def test_valid_invalid_option(self):
+        for option in ({"engine": "foo"}, {"m2m_mode": "foo"}, {"transaction_batch_size": 0},
+                       {"deferred_fields": ["char_field"]}):
+            manifest = dict({"model": "tests.MyModel", "mapping": {"char_field": "name"}}, **option)
+            td = TransferData(data=[], manifest=manifest)
+            self.assertFalse(td.valid(silent=True))
+            with self.assertRaises(InvalidManifest):
+                td.valid(silent=False)
+
+
+class BulkEngineTest(TestCase):
+
+    manifest = {"model": "tests.MyRelatedModel",
+                "mapping": {"name": "name",
+                            "key": "key"},
+                "lookup": "key",
+                "engine": "bulk",
+                "batch_size": 2}
+
+    def test_bulk_unknown_engine(self):
+        manifest = dict(self.manifest, engine="foo")
+        td = TransferData(data=[], manifest=manifest)
+        with self.assertRaises(InvalidManifest):
+            td.import_data()
+
+    def test_bulk_create(self):
+        data = [{"name": "Name {}".format(n), "key": n} for n in range(5)]
+        td = TransferData(data=data, manifest=self.manifest)
+        objs = td.import_data()
+        self.assertEqual(len(objs), 5)
+        self.assertEqual(td.report.created, 5)
+        self.assertEqual(td.report.updated, 0)
+        self.assertEqual(MyRelatedModel.objects.count(), 5)
+        for n, obj in enumerate(objs):
+            self.assertEqual(obj, MyRelatedModel.objects.get(key=n))
+
+    def test_bulk_update(self):
+        MyRelatedModel.objects.create(name="Old", key=1)
+        data = [{"name": "New", "key": 1},
+                {"name": "Other", "key": 2}]
+        td = TransferData(data=data, manifest=self.manifest)
+        td.import_data()
+        self.assertEqual(td.report.created, 1)
+        self.assertEqual(td.report.updated, 1)
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "New")
+        self.assertEqual(MyRelatedModel.objects.count(), 2)
+
+    def test_bulk_no_update(self):
+        MyRelatedModel.objects.create(name="Old", key=1)
+        manifest = dict(self.manifest, update=False)
+        td = TransferData(data=[{"name": "New", "key": 1}], manifest=manifest)
+        td.import_data()
+        self.assertEqual(td.report.created, 0)
+        self.assertEqual(td.report.updated, 0)
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "Old")
+
+    def test_bulk_duplicate_lookup_in_batch(self):
+        data = [{"name": "First", "key": 1},
+                {"name": "Second", "key": 1}]
+        td = TransferData(data=data, manifest=self.manifest)
+        objs = td.import_data()
+        self.assertEqual(objs[0], objs[1])
+        self.assertEqual(td.report.created, 1)
+        self.assertEqual(td.report.updated, 1)
+        self.assertEqual(MyRelatedModel.objects.get().name, "Second")
+
+    def test_bulk_m2m(self):
+        related = [MyRelatedModel.objects.create(name="Name", key=n) for n in range(3)]
+        data = [{"name": "foo", "related": [0, 1]},
+                {"name": "bar", "related": [2]}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "m2m_fields": ["many_related_objs"],
+                    "engine": "bulk"}
+        td = TransferData(data=data, manifest=manifest)
+        objs = td.import_data()
+        self.assertEqual(set(objs[0].many_related_objs.all()), set(related[:2]))
+        self.assertEqual(set(objs[1].many_related_objs.all()), set(related[2:]))
+
+    def test_bulk_m2m_through_rows(self):
+        related = [MyRelatedModel.objects.create(name="Name", key=n) for n in range(4)]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "lookup": "char_field",
+                    "m2m_fields": ["many_related_objs"],
+                    "engine": "bulk",
+                    "batch_size": 10}
+        TransferData(data=[{"name": "foo", "related": [0, 1]},
+                           {"name": "bar", "related": [1]}], manifest=manifest).import_data()
+        through = MyModel.many_related_objs.through
+        kept = through.objects.get(mymodel__char_field="foo", myrelatedmodel__key=1).pk
+
+        # one select, one delete and one insert for the whole batch
+        td = TransferData(data=[{"name": "foo", "related": [1, 2]},
+                                {"name": "bar", "related": [1, 3]}], manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            objs = td.import_data()
+        through_queries = [q['sql'] for q in queries.captured_queries if through._meta.db_table in q['sql']]
+        self.assertEqual(len(through_queries), 3)
+        self.assertEqual(set(objs[0].many_related_objs.all()), set(related[1:3]))
+        self.assertEqual(set(objs[1].many_related_objs.all()), set([related[1], related[3]]))
+        # unchanged relations are not recreated
+        self.assertTrue(through.objects.filter(pk=kept).exists())
+
+        # append mode keeps the existing relations
+        td = TransferData(data=[{"name": "foo", "related": [0]}], manifest=dict(manifest, m2m_mode="append"))
+        objs = td.import_data()
+        self.assertEqual(set(objs[0].many_related_objs.all()), set(related[:3]))
+
+    def test_bulk_update_keeps_identity(self):
+        manifest = {"model": "tests.MyRelatedModel",
+                    "mapping": {"pk": "id",
+                                "name": "name",
+                                "key": "key"},
+                    "lookup": "pk",
+                    "engine": "bulk"}
+        data = [{"id": "10", "name": "Old", "key": "1"}]
+        TransferData(data=data, manifest=manifest).import_data()
+        data[0]['name'] = "New"
+        objs = TransferData(data=data, manifest=manifest).import_data()
+        # existing objects keep the primary key values of the database, not the raw values of the data
+        self.assertEqual(objs[0].pk, 10)
+        self.assertEqual(MyRelatedModel.objects.get(pk=10).name, "New")
+
+    def test_bulk_m2m_string_ids(self):
+        related = [MyRelatedModel.objects.create(name="Name", key=n) for n in range(3)]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"pk": "id",
+                                "char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "lookup": "pk",
+                    "m2m_fields": ["many_related_objs"],
+                    "engine": "bulk"}
+        data = [{"id": "10", "name": "foo", "related": [0, 1]},
+                {"id": "11", "name": "bar", "related": [2]}]
+        TransferData(data=data, manifest=manifest).import_data()
+        data[0]['related'] = [1, 2]
+        TransferData(data=data, manifest=manifest).import_data()
+        self.assertEqual(set(MyModel.objects.get(pk=10).many_related_objs.all()), set(related[1:]))
+        self.assertEqual(set(MyModel.objects.get(pk=11).many_related_objs.all()), set(related[2:]))
+
+        # primary keys of the objects are matched with the through rows by value
+        obj = MyModel.objects.get(pk=10)
+        obj.pk = "10"
+        td = TransferData(data=[], manifest=manifest)
+        td._m2m_bulk_fill([(obj, {"many_related_objs": [related[0]]})])
+        self.assertEqual(list(MyModel.objects.get(pk=10).many_related_objs.all()), [related[0]])
+
+    def test_bulk_existing_lookup_one_query(self):
+        for n in range(4):
+            MyRelatedModel.objects.create(name="Old", key=n)
+        data = [{"name": "New", "key": str(n)} for n in range(8)]
+        manifest = dict(self.manifest, batch_size=8)
+        td = TransferData(data=data, manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            td.import_data()
+        selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        # lookup of existing objects + primary keys of the created objects
+        self.assertLessEqual(len(selects), 2)
+        self.assertEqual(td.report.created, 4)
+        self.assertEqual(td.report.updated, 4)
+        self.assertEqual(MyRelatedModel.objects.count(), 8)
+        self.assertFalse(MyRelatedModel.objects.filter(name="Old").exists())
+
+    def test_bulk_rollback_forgets_objects(self):
+        MyTreeModel.objects.create(name="Root", key=0)
+        manifest = {"model": "tests.MyTreeModel",
+                    "mapping": {"name": "name",
+                                "key": "key",
+                                "parent": "parent"},
+                    "parsers": {"parent": {"type": "relative_key", "data_name": "tree_data", "rk_lookup": "key"}},
+                    "lookup": "name",
+                    "engine": "bulk",
+                    "skip_integrity_errors": True}
+        # the items have the same unique key, so the batch is rolled back and imported item by item
+        data = [{"name": "A", "key": 5, "parent": 0}, {"name": "B", "key": 5, "parent": 0}]
+        td = TransferData(data=data, manifest=manifest)
+        parser = td.plan.parsers['parent']
+        dependency = parser.get_dependency()
+        cached = dependency.get_rk_obj(parser.rk, 0, lookup=parser.lookup)
+        self.assertIs(dependency.get_rk_obj(parser.rk, 0, lookup=parser.lookup), cached)
+        td.import_data()
+        self.assertEqual(len(td.report.exceptions['IntegrityError']), 1)
+        self.assertEqual(MyTreeModel.objects.get(key=5).parent.name, "Root")
+        # objects memoized before the rollback are looked up again
+        self.assertIsNot(dependency.get_rk_obj(parser.rk, 0, lookup=parser.lookup), cached)
+
+    def test_bulk_custom_handler_get(self):
+        MyRelatedModel.objects.create(name="Old", key=1)
+        context = LoaderContext()
+        context.model_handler = LegacyModelHandler()
+        data = [{"name": "New", "key": 1}, {"name": "Other", "key": 2}]
+        td = TransferData(data=data, manifest=self.manifest, context=context)
+        td.import_data()
+        # the handler does not define `bulk_get`, the objects are looked up with its `get`
+        self.assertEqual(set(context.model_handler.calls), set(['get']))
+        self.assertEqual((td.report.created, td.report.updated), (1, 1))
+        self.assertEqual(MyRelatedModel.objects.get(key=1).name, "New")
+
+    def test_bulk_composite_lookup(self):
+        MyRelatedModel.objects.create(name="Foo", key=1)
+        data = [{"name": "Foo", "key": 1},
+                {"name": "Bar", "key": 1}]
+        manifest = dict(self.manifest, lookup=["name", "key"])
+        td = TransferData(data=data, manifest=manifest)
+        td.import_data()
+        self.assertEqual(td.report.created, 1)
+        self.assertEqual(td.report.updated, 1)
+        self.assertEqual(MyRelatedModel.objects.count(), 2)
+
+
+class BatchAdaptor(BaseAdaptor):
+    models = ["tests.MyRelatedModel"]
+    calls = []
+
+    def adapt_batch(self, datas):
+        self.calls.append(('adapt_batch', len(datas)))
+        return [dict(data, name=data['name'].upper()) for data in datas]
+
+    def adapt_post_save_batch(self, objs, datas, m2m_datas):
+        self.calls.append(('adapt_post_save_batch', len(objs)))
+
+
+class ItemAdaptor(BaseAdaptor):
+    calls = []
+
+    def adapt(self, data):
+        self.calls.append('adapt')
+        return dict(data, name=data['name'] + "!")
+
+
+class OtherModelAdaptor(BaseAdaptor):
+    models = ["tests.MyModel"]
+
+    def adapt(self, data):
+        raise AssertionError("Adaptor of other model applied")
+
+
+class AdaptorsTest(TestCase):
+
+    def test_batch_adaptors(self):
+        context = LoaderContext()
+        context.adaptor_classes = [BatchAdaptor, ItemAdaptor, OtherModelAdaptor]
+        manifest = {"model": "tests.MyRelatedModel",
+                    "mapping": {"name": "name",
+                                "key": "key"},
+                    "lookup": "key",
+                    "engine": "bulk",
+                    "batch_size": 3}
+        td = TransferData(data=[{"name": "Name {}".format(n), "key": n} for n in range(5)], manifest=manifest,
+                          context=context)
+        self.assertEqual([type(adaptor) for adaptor in td.adaptors], [BatchAdaptor, ItemAdaptor])
+        td.import_data()
+        self.assertEqual(BatchAdaptor.calls, [('adapt_batch', 3), ('adapt_post_save_batch', 3),
+                                              ('adapt_batch', 2), ('adapt_post_save_batch', 2)])
+        # adaptors without batch methods are applied item by item
+        self.assertEqual(ItemAdaptor.calls, ['adapt'] * 5)
+        self.assertEqual(MyRelatedModel.objects.get(key=0).name, "NAME 0!")
+
+
+class ModelHandlerTest(TestCase):
+
+    def test_bulk_get(self):
+        related = [MyRelatedModel.objects.create(name="Name", key=n) for n in range(3)]
+        handler = ModelHandler()
+        self.assertEqual(set(handler.bulk_get(MyRelatedModel, [{"key": 0}, {"key": 2}])),
+                         set([related[0], related[2]]))
+        self.assertEqual(handler.bulk_get(MyRelatedModel, [{"key": 1, "name": "Name"}]), [related[1]])
+
+    def test_bulk_upsert(self):
+        handler = ModelHandler()
+        for model in (MyTreeModel, MyRelatedModel):
+            model.objects.create(name="Old", key=1)
+            rows = [{"name": "Name {}".format(n), "key": n} for n in range(3)]
+            handler.bulk_upsert(model, rows, ["key"], ["name"])
+            self.assertEqual(sorted(model.objects.values_list('key', 'name')),
+                             [(n, "Name {}".format(n)) for n in range(3)])
+        # native upsert needs a unique lookup
+        self.assertTrue(handler.can_bulk_upsert(MyTreeModel, ["key"]))
+        self.assertTrue(handler.can_bulk_upsert(MyTreeModel, ["pk"]))
+        self.assertFalse(handler.can_bulk_upsert(MyRelatedModel, ["key"]))
+
+    def test_bulk_engine_upsert(self):
+        MyTreeModel.objects.create(name="Old", key=0)
+        manifest = {"model": "tests.MyTreeModel",
+                    "mapping": {"name": "name",
+                                "key": "key"},
+                    "lookup": "key",
+                    "engine": "bulk"}
+        td = TransferData(data=[{"name": "Name {}".format(n), "key": n} for n in range(4)], manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            objs = td.import_data()
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('ON CONFLICT', writes[0])
+        self.assertEqual((td.report.created, td.report.updated), (3, 1))
+        self.assertEqual([obj.pk for obj in objs], [MyTreeModel.objects.get(key=n).pk for n in range(4)])
+        self.assertEqual(MyTreeModel.objects.get(key=0).name, "Name 0")
@@ -1,8 +1,13 @@
 from __future__ import unicode_literals
 import dateutil.parser
-from django.test import TestCase
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from loadjson.loaders import TransferData, RelativeKeyDoesNotExist, InvalidManifest
 from loadjson.tests.models import MyModel, MyRelatedModel
+from loadjson.parsers import parse_iso_datetime
+from loadjson.tests.parsers import UpperCaseParser
 
 
 class BaseTestCase(TestCase):
@@ -30,6 +35,40 @@ class ParsersTest(BaseTestCase):
         self.assertEqual(imported_objects[0].datetime_field, dateutil.parser.parse(data[0]['some_datetime']))
         self.assertEqual(imported_objects[0].date_field, dateutil.parser.parse(data[0]['some_date']))
 
+    def test_datetime_parser_fast_path(self):
+        values = ["2016-03-08",
+                  "2016-03-08T21:45:00Z",
+                  "2016-03-08T21:45",
+                  "2016-03-08 21:45:00.123456",
+                  "2016-03-08T21:45:00.1+02:00",
+                  "2016-03-08T21:45:00-0530",
+                  "2016-03-08T21:45:00+00:00"]
+        for value in values:
+            self.assertEqual(parse_iso_datetime(value), dateutil.parser.parse(value))
+        self.assertIsNone(parse_iso_datetime("March 8, 2016"))
+        self.assertIsNone(parse_iso_datetime("2016-02-30"))
+
+    def test_datetime_parser_stats(self):
+        data = [{"some_datetime": "2016-03-08T21:45:00Z"},
+                {"some_datetime": "2016-03-08T21:45:00Z"},
+                {"some_datetime": "Tue, 08 Mar 2016 21:45:00 +0000"}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"datetime_field": "some_datetime"},
+                    "parsers": {"datetime_field": {"type": "datetime"}}}
+        td = TransferData(data=data, manifest=manifest)
+        objs = td.import_data()
+        self.assertEqual(td.get_parser_stats(), {"datetime_field": {"fast": 1, "cached": 1, "fallback": 1}})
+        self.assertEqual(objs[2].datetime_field, objs[0].datetime_field)
+
+    def test_datetime_parser_format(self):
+        data = [{"some_datetime": "08/03/2016 21:45"}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"datetime_field": "some_datetime"},
+                    "parsers": {"datetime_field": {"type": "datetime", "format": "%d/%m/%Y %H:%M"}}}
+        td = TransferData(data=data, manifest=manifest)
+        self.assertEqual(td._to_internal(data[0])['datetime_field'], dateutil.parser.parse("2016-03-08 21:45"))
+        self.assertEqual(td.get_parser_stats()['datetime_field']['fast'], 1)
+
     def test_string_parser(self):
         data = [{"name": "Some string",
                  "number": 35,
@@ -163,6 +202,62 @@ class ParsersTest(BaseTestCase):
         self.assertIn(rel_obj2, imported_objects[0].many_related_objs.all())
         self.assertIn(rel_obj3, imported_objects[0].many_related_objs.all())
 
+    def test_relative_key_batch_resolution(self):
+        data = [{"name": "foo", "related": [0, 1, 2]},
+                {"name": "bar", "related": [2, 3, 4]},
+                {"name": "baz", "related": [1]}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "m2m_fields": ["many_related_objs"]}
+        self.import_related()
+        td = TransferData(data=data, manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            objs = td.import_data()
+        related_selects = [q for q in queries.captured_queries
+                           if q['sql'].startswith('SELECT') and 'FROM "tests_myrelatedmodel"' in q['sql']]
+        self.assertEqual(len(related_selects), 1)
+        self.assertEqual(set(r.key for r in objs[1].many_related_objs.all()), {2, 3, 4})
+        self.assertEqual(set(r.key for r in objs[2].many_related_objs.all()), {1})
+
+    @override_settings(LOAD_JSON=dict(settings.LOAD_JSON, RK_CACHE_SIZE=2, RK_CACHE_POLICY='fifo'))
+    def test_relative_key_batch_resolution_bounded_cache(self):
+        data = [{"name": "foo", "related": [0, 1, 2, 3, 4]},
+                {"name": "bar", "related": [4, 3, 2, 1, 0]}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "m2m_fields": ["many_related_objs"]}
+        self.import_related()
+        td = TransferData(data=data, manifest=manifest)
+        with CaptureQueriesContext(connection) as queries:
+            objs = td.import_data()
+        related_selects = [q for q in queries.captured_queries
+                           if q['sql'].startswith('SELECT') and 'FROM "tests_myrelatedmodel"' in q['sql']]
+        # the batch keeps its prefetched objects even if the cache can't hold them
+        self.assertEqual(len(related_selects), 1)
+        self.assertEqual(set(r.key for r in objs[1].many_related_objs.all()), set(range(5)))
+
+    def test_relative_key_many_not_prefetched(self):
+        self.import_related()
+        td = TransferData(data_name='related_data')
+        with CaptureQueriesContext(connection) as queries:
+            objs = td.get_rk_obj('key', [0, 1, 2], many=True)
+        self.assertEqual([obj.key for obj in objs], [0, 1, 2])
+        self.assertEqual(len(queries.captured_queries), 1)
+        # resolved objects are cached
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual([obj.key for obj in td.get_rk_obj('key', [2, 1], many=True)], [2, 1])
+        self.assertEqual(len(queries.captured_queries), 0)
+
     def test_relative_key_does_not_exist(self):
         data = {"name": "foo",
                 "related": 100}
@@ -225,3 +320,129 @@ class ParsersTest(BaseTestCase):
         rel2 = MyRelatedModel.objects.get(key=322)
         self.assertIn(rel1, objs[0].many_related_objs.all())
         self.assertIn(rel2, objs[0].many_related_objs.all())
+
+    def test_relative_object_loader_reused(self):
+        data = [{"name": "foo{}".format(n),
+                 "related": [{"name": "Foo", "key": 100 + n}, {"name": "Bar", "key": 200 + n}]}
+                for n in range(3)]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "many_related_objs": "related"},
+                    "parsers": {"many_related_objs": {"type": "relative_object",
+                                                      "data_name": "related_data",
+                                                      "many": True}},
+                    "m2m_fields": ["many_related_objs"]}
+        td = TransferData(data=data, manifest=manifest)
+        td.import_data()
+        self.assertEqual(len(td.context.loaders), 1)
+        nested = list(td.context.loaders.values())[0]
+        self.assertIs(nested.context, td.context)
+        self.assertEqual(nested.report.created, 6)
+        self.assertEqual(MyRelatedModel.objects.filter(key__gte=100).count(), 6)
+
+    def test_dependency_registry(self):
+        data = [{"name": "foo", "related": 1, "many_related": [2, 3]},
+                {"name": "bar", "related": 2, "many_related": [4]}]
+        manifest = {"model": "tests.MyModel",
+                    "mapping": {"char_field": "name",
+                                "related_obj": "related",
+                                "many_related_objs": "many_related"},
+                    "parsers": {"related_obj": {"type": "relative_key",
+                                                "data_name": "related_data",
+                                                "rk_lookup": "key"},
+                                "many_related_objs": {"type": "relative_key",
+                                                      "data_name": "related_data",
+                                                      "rk_lookup": "key",
+                                                      "many": True}},
+                    "m2m_fields": ["many_related_objs"]}
+        self.import_related()
+        td = TransferData(data=data, manifest=manifest)
+        objs = td.import_data()
+        dependencies = td.context.dependencies
+        self.assertEqual(dependencies.misses, 1)
+        # every parser resolves the dependency once, not for every value
+        self.assertEqual(dependencies.hits, 1)
+        self.assertEqual(objs[1].related_obj.key, 2)
+        self.assertEqual(set(r.key for r in objs[0].many_related_objs.all()), {2, 3})
+
+    def test_dependency_registry_registers_dataset(self):
+        td = TransferData(data_name='related_data')
+        self.assertIs(td.get_dependency('related_data'), td)
+        self.assertEqual(td.context.dependencies.misses, 0)
+
+    def test_dependency_projection(self):
+        td = TransferData(data=[], manifest={"model": "tests.MyModel", "mapping": {}})
+        dependency = td.get_dependency('related_data', rk='key')
+        self.assertEqual(list(dependency.data)[0], {"key": 0})
+        self.assertEqual(list(dependency.plan.parsers.keys()) + [f.field for f in dependency.plan.fields], ['key'])
+        self.assertIs(td.get_dependency('related_data', rk='key', lookup='key'), dependency)
+        # the whole dataset is required, the projected loader is replaced
+        full = td.get_dependency('related_data')
+        self.assertIsNot(full, dependency)
+        self.assertEqual(list(full.data)[0], {"name": "Name 0", "key": 0})
+        self.assertIs(td.get_dependency('related_data', rk='key'), full)
+
+    def test_dependency_projection_disabled(self):
+        with self.settings(LOAD_JSON=dict(settings.LOAD_JSON, PROJECT_DEPENDENCIES=False)):
+            td = TransferData(data=[], manifest={"model": "tests.MyModel", "mapping": {}})
+            dependency = td.get_dependency('related_data', rk='key')
+        self.assertIsNone(dependency.projection)
+        self.assertEqual(list(dependency.data)[0], {"name": "Name 0", "key": 0})
+
+    def test_relative_key_memoized(self):
+        self.import_related()
+        td = TransferData(data_name='related_data')
+        conversions = []
+        to_internal = td._to_internal
+
+        def counting_to_internal(item):
+            conversions.append(item)
+            return to_internal(item)
+        td._to_internal = counting_to_internal
+        for _ in range(3):
+            self.assertEqual(td.get_rk('key', 1), {"name": "Name 1", "key": 1})
+            self.assertEqual(td.get_rk_obj('key', 2).key, 2)
+        self.assertEqual(len(conversions), 2)
+
+    @override_settings(LOAD_JSON=dict(settings.LOAD_JSON, RK_CACHE_SIZE=1, RK_CACHE_POLICY='fifo'))
+    def test_relative_key_memoized_bounded(self):
+        self.import_related()
+        td = TransferData(data_name='related_data')
+        conversions = []
+        to_internal = td._to_internal
+
+        def counting_to_internal(item):
+            conversions.append(item)
+            return to_internal(item)
+        td._to_internal = counting_to_internal
+        for value in (1, 2, 1):
+            td.get_rk('key', value)
+        self.assertEqual(len(conversions), 3)
+
+
+@override_settings(LOAD_JSON=dict(settings.LOAD_JSON,
+                                  PARSER_CLASSES={'upper': 'loadjson.tests.parsers.UpperCaseParser'}))
+class ParserRegistryTest(BaseTestCase):
+
+    manifest = {"model": "tests.MyModel",
+                "mapping": {"char_field": "name"},
+                "parsers": {"char_field": {"type": "upper"}}}
+
+    def test_custom_parser(self):
+        td = TransferData(data=[{"name": "foo"}], manifest=self.manifest)
+        self.assertIsInstance(td.plan.parsers['char_field'], UpperCaseParser)
+        objs = td.import_data()
+        self.assertEqual(objs[0].char_field, "FOO")
+
+    def test_custom_parser_parse_many(self):
+        manifest = dict(self.manifest, engine="bulk")
+        calls = UpperCaseParser.parse_many_calls
+        td = TransferData(data=[{"name": "foo"}, {"name": "bar"}], manifest=manifest)
+        objs = td.import_data()
+        self.assertEqual(UpperCaseParser.parse_many_calls, calls + 1)
+        self.assertEqual([obj.char_field for obj in objs], ["FOO", "BAR"])
+
+    def test_unsupported_parser(self):
+        manifest = dict(self.manifest, parsers={"char_field": {"type": "foo"}})
+        with self.assertRaises(ValueError):
+            TransferData(data=[], manifest=manifest)
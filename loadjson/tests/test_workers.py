@@ -0,0 +1,96 @@
+from __future__ import unicode_literals
+import os
+import json
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from loadjson.loaders import TransferData
+from loadjson.tests.models import MyRelatedModel
+from loadjson.workers import ShardFilter, import_shard, import_sharded, merge_results, schedule
+
+
+class WorkersTest(TestCase):
+
+    data = [{"name": "Name {}".format(n), "key": n % 7} for n in range(20)]
+    manifest = {"model": "tests.MyRelatedModel",
+                "mapping": {"name": "name",
+                            "key": "key"},
+                "lookup": "key"}
+
+    def test_shard_filter(self):
+        td = TransferData(data=self.data, manifest=self.manifest)
+        for shard_by in ('hash', 'range'):
+            shards = [list(ShardFilter(td, shard, 3, shard_by=shard_by)(self.data)) for shard in range(3)]
+            self.assertEqual(sorted(item['name'] for shard in shards for item in shard),
+                             sorted(item['name'] for item in self.data))
+            self.assertTrue(all(shards))
+        # items with the same lookup are in the same shard
+        shards = [set(item['key'] for item in ShardFilter(td, shard, 3)(self.data)) for shard in range(3)]
+        self.assertEqual(sum(len(keys) for keys in shards), 7)
+        # ranges are contiguous
+        self.assertEqual(list(ShardFilter(td, 0, 4, shard_by='range')(self.data)), self.data[:5])
+
+    def write_data(self, data_dir, data_name):
+        with open(os.path.join(data_dir, data_name + '.jsonl'), 'w') as f:
+            f.write(''.join(json.dumps(item) + '\n' for item in self.data))
+        with open(os.path.join(data_dir, data_name + '.manifest.json'), 'w') as f:
+            f.write(json.dumps(self.manifest))
+
+    def test_import_shards(self):
+        data_dir = tempfile.mkdtemp()
+        try:
+            self.write_data(data_dir, 'sharded')
+            with self.settings(LOAD_JSON=dict(settings.LOAD_JSON, DATA_DIRS=[data_dir])):
+                for shard_by, stream in (('hash', False), ('range', True)):
+                    MyRelatedModel.objects.all().delete()
+                    result = merge_results([import_shard('sharded', shard, 3, shard_by=shard_by, stream=stream)
+                                            for shard in range(3)])
+                    self.assertEqual(result['item'], 20)
+                    self.assertEqual(result['created'] + result['updated'], 20)
+                    self.assertEqual(result['exceptions'], {})
+                    self.assertEqual(sorted(MyRelatedModel.objects.values_list('key', flat=True)), list(range(7)))
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_sqlite_refused(self):
+        # concurrent writes to SQLite fail with "database is locked"
+        data_dir = tempfile.mkdtemp()
+        try:
+            self.write_data(data_dir, 'sharded')
+            self.write_data(data_dir, 'other')
+            with self.settings(LOAD_JSON=dict(settings.LOAD_JSON, DATA_DIRS=[data_dir])):
+                with self.assertRaises(ValueError) as cm:
+                    import_sharded('sharded', 3, shard_by='hash')
+                self.assertIn('SQLite', str(cm.exception))
+                with self.assertRaises(CommandError) as cm:
+                    call_command('loadjson', 'sharded', workers=3)
+                self.assertIn('--workers', str(cm.exception))
+                with self.assertRaises(CommandError) as cm:
+                    call_command('loadjson', 'sharded', 'other', jobs=2)
+                self.assertIn('--jobs', str(cm.exception))
+            self.assertFalse(MyRelatedModel.objects.exists())
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_merge_results(self):
+        results = [{'created': 1, 'exceptions': {'IntegrityError': ['a']}, 'parser_stats': {'f': {'fast': 1}},
+                    'bytes_read': None},
+                   {'created': 2, 'exceptions': {'IntegrityError': ['b']}, 'parser_stats': {'f': {'fast': 2}},
+                    'bytes_read': None}]
+        self.assertEqual(merge_results(results), {'created': 3, 'exceptions': {'IntegrityError': ['a', 'b']},
+                                                  'parser_stats': {'f': {'fast': 3}}, 'bytes_read': None})
+
+    def test_schedule(self):
+        graph = {'a': set(), 'b': {'a'}, 'c': {'b'}, 'd': set()}
+        results, errors = {}, {}
+        self.assertEqual(schedule(graph, results, errors, set()), ['a', 'd'])
+        self.assertEqual(schedule(graph, results, errors, {'a', 'd'}), [])
+        results['a'] = {}
+        self.assertEqual(schedule(graph, results, errors, {'d'}), ['b'])
+        # datasets that depend on a failed dataset are not imported
+        errors['b'] = "error"
+        self.assertEqual(schedule(graph, results, errors, {'d'}), [])
+        self.assertEqual(sorted(errors), ['b', 'c'])
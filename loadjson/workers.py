@@ -0,0 +1,248 @@
+import zlib
+import traceback
+import multiprocessing
+from collections import defaultdict
+from six.moves import queue
+from .incremental import lookup_paths, lookup_key
+from .loaders import TransferData, LoaderContext
+from .streams import DataStream
+
+SHARD_BY = ('hash', 'range')
+
+
+class ShardFilter(object):
+    """
+    Item filter (see `TransferData.import_data`) that selects the items of shard number `shard` of `shards`.
+
+    `shard_by`:
+    - "hash" - by hash of the raw lookup values, so items with the same lookup never go to different shards
+    - "range" - by position, the shards are contiguous ranges of items if the number of items is known
+    """
+
+    def __init__(self, loader, shard, shards, shard_by='hash'):
+        self.loader = loader
+        self.shard = shard
+        self.shards = shards
+        self.shard_by = shard_by
+        self.key_paths = lookup_paths(loader) if shard_by == 'hash' else None
+
+    def get_shard(self, item, index, count):
+        if self.shard_by == 'hash':
+            key = lookup_key(self.loader, item, self.key_paths)
+            return (zlib.crc32(key.encode('utf-8')) & 0xffffffff) % self.shards
+        if count is not None:
+            return index * self.shards // count
+        return index % self.shards
+
+    def __call__(self, items):
+        count = len(items) if isinstance(items, list) else None
+        for index, item in enumerate(items):
+            if self.get_shard(item, index, count) == self.shard:
+                yield item
+
+
+def get_result(loader, context=None):
+    """
+    Returns: :dict - report counters, exception messages and parser stats of `loader`, that can be
+        passed between processes and merged by `merge_results`
+    """
+    report = loader.report
+    context = context or loader.context
+    return {
+        'item': report.item,
+        'created': report.created,
+        'updated': report.updated,
+        'unchanged': report.unchanged,
+        'exceptions': dict((exc_type, [str(e) for e in exc_list])
+                           for exc_type, exc_list in iter(report.exceptions.items())),
+        'parser_stats': loader.get_parser_stats(),
+        'bytes_read': report.bytes_read,
+        'bytes_decompressed': report.bytes_decompressed,
+        'dependencies_loaded': context.dependencies.misses,
+        'dependencies_reused': context.dependencies.hits,
+    }
+
+
+def merge_results(results):
+    """
+    Sum the results of shards, see `get_result`.
+    """
+    merged = {'exceptions': defaultdict(list), 'parser_stats': {}}
+    for result in results:
+        for key, value in iter(result.items()):
+            if key == 'exceptions':
+                for exc_type, exc_list in iter(value.items()):
+                    merged['exceptions'][exc_type].extend(exc_list)
+            elif key == 'parser_stats':
+                for field, stats in iter(value.items()):
+                    field_stats = merged['parser_stats'].setdefault(field, {})
+                    for stat, count in iter(stats.items()):
+                        field_stats[stat] = field_stats.get(stat, 0) + count
+            elif value is not None:
+                merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, None)
+    merged['exceptions'] = dict(merged['exceptions'])
+    return merged
+
+
+def import_shard(data_name, shard, shards, shard_by='hash', stream=None, decoder=None, manifest_options=None):
+    """
+    Import one shard of `data_name` dataset, run by every worker process.
+
+    Args:
+        data_name: data to import
+        shard: int - number of the shard, from 0 to `shards` - 1
+        shards: int - number of shards
+        shard_by: "hash" or "range", see `ShardFilter`
+        stream: bool - read data items one by one, see `STREAM` setting
+        decoder: JSON decoder name, see `JSON_DECODER` setting
+        manifest_options: dict - manifest values to override
+
+    Returns: :dict - the result of the shard, see `get_result`
+    """
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # spawned processes do not inherit the configured Django
+        django.setup()
+    context = LoaderContext(stream=stream, decoder=decoder)
+    loader = TransferData(data_name=data_name, context=context)
+    if manifest_options:
+        loader.manifest = dict(loader.manifest, **manifest_options)
+    item_filter = ShardFilter(loader, shard, shards, shard_by=shard_by) if shards > 1 else None
+    splittable = isinstance(loader.data, DataStream) and hasattr(loader.data, 'split')
+    if item_filter is not None and shard_by == 'range' and splittable:
+        try:
+            # read only the part of the file that belongs to the shard
+            loader.data = loader.data.split(shards)[shard]
+            item_filter = None
+        except ValueError:
+            pass
+    try:
+        loader.import_data(keep_objects=False, item_filter=item_filter)
+    finally:
+        context.close()
+    return get_result(loader, context)
+
+
+def check_concurrent_writes(data_names, context=None):
+    """
+    Datasets can't be imported by several processes at the same time into a SQLite database: concurrent writes
+    fail with "database is locked".
+
+    Raises: ValueError if any of `data_names` is imported into a SQLite database
+    """
+    from django.db import connections, router
+    context = context or LoaderContext()
+    for data_name in data_names:
+        manifest = context.find_data(data_name, data=False)[1] or {}
+        if not manifest.get('model'):
+            continue
+        connection = connections[router.db_for_write(context.get_model(manifest['model']))]
+        if connection.vendor == 'sqlite':
+            raise ValueError("'{}' is imported into a SQLite database, which does not support concurrent "
+                             "writes of several processes".format(data_name))
+
+
+def _import_shard(kwargs):
+    return import_shard(**kwargs)
+
+
+def import_sharded(data_name, workers, shard_by='hash', **kwargs):
+    """
+    Import `data_name` dataset by `workers` processes, every process imports one shard of the data
+    (see `import_shard`) with its own database connection. The data is always streamed, so the processes do not
+    keep a copy of the whole data each.
+
+    Raises: ValueError if the data is imported into a SQLite database, see `check_concurrent_writes`
+
+    Returns: :dict - merged results of the shards, see `merge_results`
+    """
+    from django.db import connections
+    check_concurrent_writes([data_name], LoaderContext(decoder=kwargs.get('decoder')))
+    kwargs['stream'] = True
+    # connections must not be shared with the worker processes
+    for connection in connections.all():
+        connection.close()
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_import_shard, [dict(kwargs, data_name=data_name, shard=shard, shards=workers,
+                                                shard_by=shard_by)
+                                           for shard in range(workers)])
+    finally:
+        pool.close()
+        pool.join()
+    return merge_results(results)
+
+
+def _import_dataset(kwargs):
+    """
+    Import a whole dataset, never raises so the scheduler always learns that the dataset is done.
+
+    Returns: :tuple (data name, result or None, error message or None)
+    """
+    try:
+        return kwargs['data_name'], import_shard(shard=0, shards=1, **kwargs), None
+    except Exception:
+        return kwargs['data_name'], None, traceback.format_exc()
+
+
+def schedule(graph, results, errors, running):
+    """
+    Datasets of `graph` that can be imported now: all the datasets they depend on are imported.
+    Datasets that depend on failed datasets are added to `errors`.
+
+    Returns: :list of data names
+    """
+    ready = []
+    failed = True
+    while failed:
+        failed = False
+        for data_name in sorted(graph):
+            if data_name in results or data_name in errors or data_name in running or data_name in ready:
+                continue
+            failed_dependencies = graph[data_name] & set(errors)
+            if failed_dependencies:
+                errors[data_name] = "Not imported, depends on: {}".format(", ".join(sorted(failed_dependencies)))
+                failed = True
+            elif graph[data_name] <= set(results):
+                ready.append(data_name)
+    return ready
+
+
+def import_scheduled(graph, jobs, **kwargs):
+    """
+    Import datasets of dependency `graph` (see `loadjson.graph.build_graph`) by `jobs` processes.
+    A dataset is imported as soon as all the datasets it depends on are imported, so independent datasets
+    are imported concurrently. Datasets that depend on a failed dataset are not imported.
+
+    Raises: ValueError if any dataset is imported into a SQLite database, see `check_concurrent_writes`
+
+    Returns: :tuple (dict - data name -> result (see `get_result`), dict - data name -> error message)
+    """
+    from django.db import connections
+    check_concurrent_writes(sorted(graph), LoaderContext(decoder=kwargs.get('decoder')))
+    for connection in connections.all():
+        connection.close()
+    results, errors = {}, {}
+    running = set()
+    done = queue.Queue()
+    pool = multiprocessing.Pool(jobs)
+    try:
+        while True:
+            for data_name in schedule(graph, results, errors, running):
+                running.add(data_name)
+                pool.apply_async(_import_dataset, (dict(kwargs, data_name=data_name),), callback=done.put)
+            if not running:
+                break
+            data_name, result, error = done.get()
+            running.discard(data_name)
+            if error is None:
+                results[data_name] = result
+            else:
+                errors[data_name] = error
+    finally:
+        pool.close()
+        pool.join()
+    return results, errors